@@ -0,0 +1,46 @@
+# micro-benchmark of checksum backends for protocol fragment sizes
+# run from repository root: python -m benchmarks.checksum_backends
+import argparse
+import os
+import timeit
+
+import checksum
+
+FRAGMENT_SIZES = [1, 16, 64, 256, 512, 1024, 1449]
+
+
+def backends():
+    result = {f"crc16-{name}": function for name, function in checksum.crc16_backends.items()}
+    result['crc32'] = checksum.crc32
+    return result
+
+
+def run(sizes, seconds):
+    rows = []
+    for size in sizes:
+        data = os.urandom(size)
+        #every CRC16 backend has to give the same value
+        values = {checksum.crc16_backends[name](data) for name in checksum.crc16_backends}
+        assert len(values) == 1, f"CRC16 backends differ for {size}B"
+        for name, function in backends().items():
+            timer = timeit.Timer(lambda: function(data))
+            number, elapsed = timer.autorange()
+            #repeat until requested time is used
+            repeat = max(1, int(seconds / elapsed))
+            best = min(timer.repeat(repeat=repeat, number=number)) / number
+            rows.append((size, name, best * 1e6, size / best / 1e6))
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Checksum backends micro-benchmark")
+    parser.add_argument('--sizes', type=int, nargs='+', default=FRAGMENT_SIZES, help="fragment sizes in bytes")
+    parser.add_argument('--seconds', type=float, default=0.5, help="approximate time per measurement")
+    args = parser.parse_args()
+    print(f"{'size(B)':>8} {'backend':<16} {'us/call':>10} {'MB/s':>10}")
+    for size, name, micros, throughput in run(args.sizes, args.seconds):
+        print(f"{size:>8} {name:<16} {micros:>10.3f} {throughput:>10.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,115 @@
+# congestion controllers compared on simulated bottleneck link
+# run from repository root: python -m benchmarks.congestion
+import argparse
+import collections
+import random
+
+import congestion
+
+
+#fixed window used by protocol before congestion control
+def advertised_window(last_fragment):
+    if last_fragment / 2 >= 65535:
+        return 65535
+    return max(1, last_fragment // 2)
+
+
+#one transfer over link with bottleneck queue, time is counted in ticks,
+#bottleneck forwards one fragment per tick, fragments over queue capacity are dropped
+def simulate(name, fragments, queue_size, rtt, loss, seed, max_ticks=10 ** 6):
+    rng = random.Random(seed)
+    clock = [0.0]
+    last_fragment = fragments - 1
+    window_size = advertised_window(last_fragment)
+    controller = congestion.create_controller(name, window_size, clock=lambda: clock[0] / 1000)
+    rto = 2 * rtt
+    bottleneck = collections.deque()
+    #(arrival tick, fragment) on the way to receiver, (arrival tick, ack, sacked) on the way back
+    to_receiver = collections.deque()
+    to_sender = collections.deque()
+    received = set()
+    rn = 0
+    sf = 0
+    next_fragment = 0
+    sacked = set()
+    retransmitted = {}
+    last_progress = 0
+    sent = drops = 0
+    for tick in range(max_ticks):
+        clock[0] = tick
+        #acknowledgements
+        while to_sender and to_sender[0][0] <= tick:
+            _, ack, receiver_set = to_sender.popleft()
+            if ack + 1 > sf:
+                acked = ack + 1 - sf - sum(1 for i in sacked if i <= ack)
+                sf = ack + 1
+                sacked = {i for i in sacked if i >= sf}
+                controller.on_ack(acked)
+                last_progress = tick
+            new = [i for i in receiver_set if i >= sf and i not in sacked]
+            if new:
+                sacked.update(new)
+                controller.on_ack(len(new))
+                last_progress = tick
+                for hole in range(sf, max(sacked)):
+                    if hole not in sacked and tick - retransmitted.get(hole, -rto) >= rtt:
+                        controller.on_loss(hole, next_fragment - 1)
+                        retransmitted[hole] = tick
+                        sent += 1
+                        if len(bottleneck) < queue_size:
+                            bottleneck.append(hole)
+                        else:
+                            drops += 1
+        if sf > last_fragment:
+            return tick, sent, drops
+        #retransmission timeout
+        if next_fragment > sf and tick - last_progress > rto:
+            controller.on_timeout(next_fragment - 1)
+            next_fragment = sf
+            last_progress = tick
+        #sending as much as windows allow
+        while True:
+            while next_fragment in sacked:
+                next_fragment += 1
+            in_flight = next_fragment - sf - sum(1 for i in sacked if i < next_fragment)
+            if next_fragment > last_fragment or next_fragment >= sf + window_size or in_flight >= controller.window():
+                break
+            sent += 1
+            if len(bottleneck) < queue_size and rng.random() >= loss:
+                bottleneck.append(next_fragment)
+            else:
+                drops += 1
+            next_fragment += 1
+        #bottleneck forwards one fragment
+        if bottleneck:
+            to_receiver.append((tick + rtt // 2, bottleneck.popleft()))
+        #receiver acknowledges every fragment
+        while to_receiver and to_receiver[0][0] <= tick:
+            _, frag_num = to_receiver.popleft()
+            received.add(frag_num)
+            while rn in received:
+                received.discard(rn)
+                rn += 1
+            to_sender.append((tick + rtt - rtt // 2, rn - 1, frozenset(received)))
+    return max_ticks, sent, drops
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Congestion control benchmark on simulated bottleneck")
+    parser.add_argument('--fragments', type=int, nargs='+', default=[50, 500, 5000])
+    parser.add_argument('--queue', type=int, default=64, help="bottleneck queue size in fragments")
+    parser.add_argument('--rtt', type=int, default=40, help="round trip time in ticks")
+    parser.add_argument('--loss', type=float, nargs='+', default=[0.0, 0.01])
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+    print(f"{'fragments':>9} {'loss':>6} {'controller':<10} {'ticks':>8} {'utilization':>11} {'retransmit':>10} {'drops':>7}")
+    for fragments in args.fragments:
+        for loss in args.loss:
+            for name in congestion.controllers:
+                ticks, sent, drops = simulate(name, fragments, args.queue, args.rtt, loss, args.seed)
+                print(f"{fragments:>9} {loss:>6.2%} {name:<10} {ticks:>8} {fragments / max(ticks, 1):>11.2%} "
+                      f"{(sent - fragments) / fragments:>10.2%} {drops:>7}")
+
+
+if __name__ == '__main__':
+    main()
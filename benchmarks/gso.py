@@ -0,0 +1,84 @@
+# sending of fragments datagram by datagram compared with UDP segmentation offload (GSO/GRO) over loopback
+# run from repository root: python -m benchmarks.gso
+import argparse
+import socket
+import threading
+import time
+
+import gso
+
+
+#receiver counts datagrams and system calls until all datagrams arrive or socket is idle
+def receive(sock, count, use_gro, progress):
+    try:
+        while progress['received'] < count:
+            if use_gro:
+                datagrams, _ = gso.receive_segments(sock)
+                progress['received'] += len(datagrams)
+            else:
+                sock.recvfrom(65535)
+                progress['received'] += 1
+            progress['calls'] += 1
+    except socket.timeout:
+        pass
+
+
+def run(size, count, window, use_gso, use_gro):
+    receiver = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    receiver.bind(('127.0.0.1', 0))
+    receiver.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 8 * 1024 * 1024)
+    receiver.settimeout(0.5)
+    if use_gro:
+        gso.set_gro(receiver, True)
+    sender = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    address = receiver.getsockname()
+    datagram = bytes(size)
+    batch_size = gso.max_segments(size) if use_gso else 1
+    progress = {'received': 0, 'calls': 0}
+    thread = threading.Thread(target=receive, args=(receiver, count, use_gro, progress))
+    thread.start()
+    start = time.perf_counter()
+    sent = calls = 0
+    while sent < count:
+        #at most window datagrams are in flight, so benchmark measures delivery and not drops
+        while sent - progress['received'] >= window and thread.is_alive():
+            time.sleep(0)
+        batch = [datagram] * min(batch_size, count - sent)
+        if use_gso:
+            gso.send_segments(sender, batch, address)
+        else:
+            sender.sendto(datagram, address)
+        sent += len(batch)
+        calls += 1
+    thread.join()
+    elapsed = time.perf_counter() - start
+    sender.close()
+    receiver.close()
+    return elapsed, calls, progress['calls'], progress['received']
+
+
+def main():
+    parser = argparse.ArgumentParser(description="UDP segmentation offload benchmark on loopback")
+    parser.add_argument('--sizes', type=int, nargs='+', default=[500, 1460])
+    parser.add_argument('--count', type=int, default=100000, help="number of datagrams")
+    parser.add_argument('--window', type=int, default=512, help="datagrams in flight")
+    args = parser.parse_args()
+    probe = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    supported = gso.gso_supported(probe), gso.set_gro(probe, True)
+    probe.close()
+    print(f"GSO supported: {supported[0]}, GRO supported: {supported[1]}")
+    modes = [('sendto', False, False)]
+    if supported[0]:
+        modes.append(('gso', True, False))
+    if all(supported):
+        modes.append(('gso+gro', True, True))
+    print(f"{'size':>6} {'mode':<8} {'send calls':>10} {'recv calls':>10} {'delivered':>9} {'seconds':>8} {'MB/s':>8}")
+    for size in args.sizes:
+        for name, use_gso, use_gro in modes:
+            elapsed, send_calls, receive_calls, received = run(size, args.count, args.window, use_gso, use_gro)
+            print(f"{size:>6} {name:<8} {send_calls:>10} {receive_calls:>10} {received / args.count:>9.2%} "
+                  f"{elapsed:>8.3f} {received * size / elapsed / 1e6:>8.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,322 @@
+# transfer of files between two engines over loopback, sweep of file size, fragment size, window and corruption
+# run from repository root: python -m benchmarks.loopback --output results.json
+# comparison with earlier run: python -m benchmarks.loopback --baseline results.json
+import argparse
+import asyncio
+import hashlib
+import itertools
+import json
+import multiprocessing
+import os
+import platform
+import queue
+import random
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+from engine import Engine, MAX_FRAGMENT_SIZE
+from logger import Logger, OFF
+
+FILE_SIZES = [100000, 1000000]
+FRAGMENT_SIZES = [64, 512, MAX_FRAGMENT_SIZE]
+#0 = window derived from number of fragments
+WINDOWS = [0, 64, 1024]
+#simulated corruption of fragments sent by sender in %
+CORRUPTION_RATES = [0, 1, 5]
+#configurations with more fragments take too long and are skipped
+MAX_FRAGMENTS = 100000
+#parameters identifying configuration in results and baseline
+PARAMETERS = ('file_size', 'fragment_size', 'window', 'corruption')
+#measurements compared with baseline, True when higher value is better
+COMPARED = {'goodput': True, 'cpu_seconds': False, 'retransmission_ratio': False}
+
+
+#peak resident set size of this process in MB, None without resource module
+def peak_rss():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    #bytes on macOS, kilobytes elsewhere
+    return peak / 2 ** 20 if sys.platform == 'darwin' else peak / 2 ** 10
+
+
+def settings_for(directory, fragment_size, window, corruption):
+    return {'download_address': directory, 'max_fragment_size': fragment_size, 'window_size': window,
+            'corruption_rate': corruption}
+
+
+#receiver reports its address, waits for file and for disconnection of sender
+async def receive(settings, addresses, results, timeout):
+    received = asyncio.Event()
+    disconnected = asyncio.Event()
+    engine = Engine(('127.0.0.1', 0), logger=Logger(OFF),
+                    status=lambda connected, sending: received.is_set() and not connected and disconnected.set(),
+                    received=lambda kind, value, peer: received.set())
+    await engine.start()
+    try:
+        engine.configure(settings)
+        addresses.put(engine.sock.getsockname())
+        cpu_start = time.process_time()
+        await asyncio.wait_for(received.wait(), timeout)
+        cpu = time.process_time() - cpu_start
+        await asyncio.wait_for(disconnected.wait(), timeout)
+        stats = engine.stats()
+        results.put(('receiver', {'cpu_seconds': cpu, 'peak_rss_mb': peak_rss(),
+                                  'fragments_received': stats.get('fragments_received', 0),
+                                  'fragments_corrupted': stats.get('fragments_corrupted', 0),
+                                  'fragments_duplicated': stats.get('fragments_duplicated', 0),
+                                  'reqs_sent': stats.get('reqs_sent', 0)}))
+    finally:
+        await engine.close()
+
+
+async def send(settings, address, path, results):
+    engine = Engine(('127.0.0.1', 0), address, logger=Logger(OFF))
+    await engine.start()
+    try:
+        engine.configure(settings)
+        cpu_start = time.process_time()
+        delivered = await engine.connect() and await engine.send_file(path)
+        cpu = time.process_time() - cpu_start
+        if engine.peers():
+            await engine.disconnect()
+        stats = engine.stats()
+        transfer = stats['last_transfer'] or {}
+        results.put(('sender', {'delivered': bool(delivered), 'cpu_seconds': cpu, 'peak_rss_mb': peak_rss(),
+                                'seconds': transfer.get('seconds'), 'goodput': transfer.get('goodput'),
+                                'throughput': transfer.get('throughput'),
+                                'fragments_sent': stats.get('fragments_sent', 0),
+                                'fragments_retransmitted': stats.get('fragments_retransmitted', 0),
+                                'timeouts': transfer.get('timeouts', 0)}))
+    finally:
+        await engine.close()
+
+
+def receiver_main(settings, addresses, results, timeout):
+    asyncio.run(receive(settings, addresses, results, timeout))
+
+
+def sender_main(settings, address, path, results):
+    asyncio.run(send(settings, address, path, results))
+
+
+def file_hash(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as file:
+        for block in iter(lambda: file.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+#one transfer, every peer runs in its own process, so CPU time and peak RSS are measured per peer
+def run_once(source, source_hash, directory, fragment_size, window, corruption, timeout):
+    received_directory = os.path.join(directory, 'received')
+    shutil.rmtree(received_directory, ignore_errors=True)
+    os.mkdir(received_directory)
+    addresses = multiprocessing.Queue()
+    results = multiprocessing.Queue()
+    receiver = multiprocessing.Process(target=receiver_main, daemon=True,
+                                       args=(settings_for(received_directory, fragment_size, window, 0), addresses,
+                                             results, timeout))
+    receiver.start()
+    sender = None
+    reports = {}
+    try:
+        address = addresses.get(timeout=timeout)
+        sender = multiprocessing.Process(target=sender_main, daemon=True,
+                                         args=(settings_for(directory, fragment_size, window, corruption), address,
+                                               source, results))
+        sender.start()
+        deadline = time.monotonic() + timeout
+        while len(reports) < 2:
+            role, report = results.get(timeout=max(0.0, deadline - time.monotonic()))
+            reports[role] = report
+            #receiver never finishes when file wasn't delivered
+            if role == 'sender' and not report['delivered']:
+                break
+    except queue.Empty:
+        pass
+    finally:
+        for process in (sender, receiver):
+            if process is not None:
+                process.join(1)
+                if process.is_alive():
+                    process.terminate()
+                    process.join()
+    sent = reports.get('sender')
+    received = reports.get('receiver')
+    if sent is None or received is None or not sent['delivered']:
+        return {'ok': False, 'error': 'timeout' if sent is None else 'not delivered'}
+    path = os.path.join(received_directory, os.path.basename(source))
+    fragments_sent = sent['fragments_sent']
+    return {
+        'ok': os.path.isfile(path) and file_hash(path) == source_hash,
+        'seconds': sent['seconds'],
+        'goodput': sent['goodput'],
+        'throughput': sent['throughput'],
+        'retransmission_ratio': sent['fragments_retransmitted'] / fragments_sent if fragments_sent else 0.0,
+        'fragments_sent': fragments_sent,
+        'fragments_retransmitted': sent['fragments_retransmitted'],
+        'timeouts': sent['timeouts'],
+        'fragments_corrupted': received['fragments_corrupted'],
+        'fragments_duplicated': received['fragments_duplicated'],
+        'reqs_sent': received['reqs_sent'],
+        'cpu_seconds': sent['cpu_seconds'] + received['cpu_seconds'],
+        'sender_cpu_seconds': sent['cpu_seconds'],
+        'receiver_cpu_seconds': received['cpu_seconds'],
+        'sender_peak_rss_mb': sent['peak_rss_mb'],
+        'receiver_peak_rss_mb': received['peak_rss_mb']}
+
+
+#measurements of repeated runs are reduced to median, configuration fails when any run fails
+def summarize(runs):
+    result = {'ok': all(run['ok'] for run in runs), 'runs': len(runs)}
+    errors = [run['error'] for run in runs if 'error' in run]
+    if errors:
+        result['error'] = errors[0]
+    finished = [run for run in runs if 'error' not in run]
+    for name in (finished[0] if finished else {}):
+        values = [run[name] for run in finished if isinstance(run[name], (int, float)) and
+                  not isinstance(run[name], bool)]
+        if values and name != 'ok':
+            result[name] = statistics.median(values)
+    return result
+
+
+def configurations(args):
+    for file_size, fragment_size in itertools.product(args.file_sizes, args.fragment_sizes):
+        if file_size // fragment_size + 1 > args.max_fragments:
+            print(f"skipped {file_size}B in {fragment_size}B fragments, more than {args.max_fragments} fragments",
+                  file=sys.stderr)
+            continue
+        for window, corruption in itertools.product(args.windows, args.corruption):
+            yield {'file_size': file_size, 'fragment_size': fragment_size, 'window': window, 'corruption': corruption}
+
+
+def commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(args):
+    results = []
+    directory = tempfile.mkdtemp(prefix='loopback-benchmark-')
+    #file size -> (path, hash) of sent file
+    sources = {}
+    try:
+        for parameters in configurations(args):
+            file_size = parameters['file_size']
+            if file_size not in sources:
+                #the same content for every run with the same seed
+                source = os.path.join(directory, f"source-{file_size}.bin")
+                with open(source, 'wb') as file:
+                    file.write(random.Random(args.seed + file_size).randbytes(file_size))
+                sources[file_size] = source, file_hash(source)
+            source, source_hash = sources[file_size]
+            runs = [run_once(source, source_hash, directory, parameters['fragment_size'], parameters['window'],
+                             parameters['corruption'], args.timeout) for _ in range(args.repeat)]
+            result = dict(parameters, **summarize(runs))
+            print_result(result)
+            results.append(result)
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+    return {'meta': {'commit': commit(), 'python': platform.python_version(), 'platform': platform.platform(),
+                     'cpus': os.cpu_count(), 'time': time.strftime('%Y-%m-%dT%H:%M:%S'), 'seed': args.seed,
+                     'repeat': args.repeat},
+            'results': results}
+
+
+def print_header():
+    print(f"{'size(B)':>9} {'frag':>5} {'window':>6} {'corr%':>5} {'ok':>3} {'MB/s':>8} {'retx':>7} "
+          f"{'cpu(s)':>7} {'rss(MB)':>8}")
+
+
+def print_result(result):
+    if 'goodput' not in result:
+        print(f"{result['file_size']:>9} {result['fragment_size']:>5} {result['window']:>6} {result['corruption']:>5} "
+              f"{'no':>3} {result.get('error', '')}", flush=True)
+        return
+    rss = max(result.get('sender_peak_rss_mb') or 0, result.get('receiver_peak_rss_mb') or 0)
+    print(f"{result['file_size']:>9} {result['fragment_size']:>5} {result['window']:>6} {result['corruption']:>5} "
+          f"{'yes' if result['ok'] else 'no':>3} {result['goodput'] / 1e6:>8.2f} "
+          f"{result['retransmission_ratio']:>7.2%} {result['cpu_seconds']:>7.3f} {rss:>8.1f}", flush=True)
+
+
+#results are compared with baseline configuration by configuration,
+#change worse than tolerance is regression, returns list of regressions
+def compare(current, baseline, tolerance):
+    previous = {tuple(result[name] for name in PARAMETERS): result for result in baseline['results']}
+    regressions = []
+    print(f"\ncompared with baseline {baseline['meta'].get('commit')} ({baseline['meta'].get('time')})")
+    for result in current['results']:
+        key = tuple(result[name] for name in PARAMETERS)
+        old = previous.get(key)
+        if old is None:
+            continue
+        changes = []
+        for name, higher_is_better in COMPARED.items():
+            if name not in result or name not in old:
+                continue
+            #ratio of retransmissions is compared by difference, it is often close to 0
+            if name == 'retransmission_ratio':
+                change = result[name] - old[name]
+            elif old[name]:
+                change = result[name] / old[name] - 1
+            else:
+                change = 0.0
+            changes.append(f"{name} {change:+.1%}")
+            if (-change if higher_is_better else change) > tolerance:
+                regressions.append((key, name, old[name], result[name]))
+        if old.get('ok') and not result.get('ok'):
+            regressions.append((key, 'ok', True, False))
+        print(f"{key}: {', '.join(changes)}")
+    for key, name, old, new in regressions:
+        print(f"REGRESSION {dict(zip(PARAMETERS, key))} {name}: {old} -> {new}")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Transfer protocol benchmark on loopback")
+    parser.add_argument('--file-sizes', type=int, nargs='+', default=FILE_SIZES, help="sizes of files in bytes")
+    parser.add_argument('--fragment-sizes', type=int, nargs='+', default=FRAGMENT_SIZES,
+                        help=f"fragment sizes 1-{MAX_FRAGMENT_SIZE}B")
+    parser.add_argument('--windows', type=int, nargs='+', default=WINDOWS,
+                        help="largest windows in fragments, 0 = by size of file")
+    parser.add_argument('--corruption', type=float, nargs='+', default=CORRUPTION_RATES,
+                        help="simulated corruption rates of sent fragments in %%")
+    parser.add_argument('--repeat', type=int, default=3, help="runs of every configuration, median is reported")
+    parser.add_argument('--seed', type=int, default=0, help="seed of content of files")
+    parser.add_argument('--timeout', type=float, default=120, help="seconds for one transfer")
+    parser.add_argument('--max-fragments', type=int, default=MAX_FRAGMENTS,
+                        help="configurations with more fragments are skipped")
+    parser.add_argument('--output', help="JSON file with results")
+    parser.add_argument('--baseline', help="JSON file with earlier results, regressions end with exit code 1")
+    parser.add_argument('--tolerance', type=float, default=0.1, help="allowed relative change against baseline")
+    args = parser.parse_args(argv)
+    print_header()
+    results = run(args)
+    if args.output:
+        with open(args.output, 'w') as file:
+            json.dump(results, file, indent=1)
+    if args.baseline:
+        with open(args.baseline) as file:
+            baseline = json.load(file)
+        if compare(results, baseline, args.tolerance):
+            return 1
+    return 0 if all(result['ok'] for result in results['results']) else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,135 @@
+import hashlib
+import json
+import os
+
+#received prefix of file is hashed in blocks, checkpoint is saved after every block,
+#so interrupted transfer loses at most one block
+BLOCK_SIZE = 1024 * 1024
+#resume field of parameters asking receiver for its checkpoint
+PROBE = '?'
+
+
+#file is identified by size and time of modification, changed file starts from beginning
+def file_identity(path):
+    status = os.stat(path)
+    return f"{status.st_size}-{status.st_mtime_ns}"
+
+
+#checkpoint is hidden file next to received file, named by file name sent by peer
+def checkpoint_path(download_path):
+    directory, name = os.path.split(download_path)
+    return os.path.join(directory, f".{name}.checkpoint")
+
+
+#digest of prefix is chained over blocks, every block is hashed together with digest of blocks before it,
+#so receiver continues from digest in checkpoint without hashing the prefix again
+def chain(digest, block):
+    return hashlib.sha256(digest + block).digest()
+
+
+#digest of first offset bytes of file computed by sender, offset is multiple of block size
+def prefix_digest(path, offset):
+    digest = b''
+    with open(path, 'rb') as file:
+        while offset > 0:
+            block = file.read(min(BLOCK_SIZE, offset))
+            if not block:
+                break
+            digest = chain(digest, block)
+            offset -= len(block)
+    return digest.hex()
+
+
+#resume point offset:digest sent in parameters and in acknowledgement of probe
+def format_point(offset, digest):
+    return f"{offset}:{digest}"
+
+
+def parse_point(text):
+    offset, _, digest = text.partition(':')
+    try:
+        return int(offset), digest
+    except ValueError:
+        return 0, ''
+
+
+#checkpoint of the same file, its last block is compared with received file, so file changed on disk
+#or overwritten by another transfer isn't resumed
+def load_checkpoint(path, identity):
+    try:
+        with open(path) as file:
+            state = json.load(file)
+        offset = state['offset']
+        if state['identity'] != identity or offset <= 0 or offset % BLOCK_SIZE:
+            return None
+        with open(state['path'], 'rb') as file:
+            file.seek(offset - BLOCK_SIZE)
+            if chain(bytes.fromhex(state['previous']), file.read(BLOCK_SIZE)).hex() == state['digest']:
+                return state
+    except (OSError, ValueError, KeyError, TypeError):
+        pass
+    return None
+
+
+#checkpoint is replaced at once, so interrupted write leaves the previous one
+def save_checkpoint(path, state):
+    temporary = path + '.tmp'
+    with open(temporary, 'w') as file:
+        json.dump(state, file)
+    os.replace(temporary, path)
+
+
+def remove_checkpoint(path):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+#sink of received file, written bytes are hashed and checkpoint is saved after every full block,
+#state holds identity of file, path of received file, offset and digest of saved prefix
+class CheckpointSink:
+    def __init__(self, file, path, state):
+        self.file = file
+        self.path = path
+        self.state = state
+        self.digest = bytes.fromhex(state['digest'])
+        self.hasher = hashlib.sha256(self.digest)
+        #bytes of current block
+        self.pending = 0
+
+    def write(self, data):
+        self.file.write(data)
+        room = BLOCK_SIZE - self.pending
+        if len(data) < room:
+            self.hasher.update(data)
+            self.pending += len(data)
+            return
+        view = memoryview(data)
+        while len(view) >= room:
+            self.hasher.update(view[:room])
+            view = view[room:]
+            self.save_block()
+            room = BLOCK_SIZE
+        self.hasher.update(view)
+        self.pending = len(view)
+
+    def save_block(self):
+        previous, self.digest = self.digest, self.hasher.digest()
+        self.hasher = hashlib.sha256(self.digest)
+        self.pending = 0
+        self.state.update(offset=self.state['offset'] + BLOCK_SIZE, digest=self.digest.hex(), previous=previous.hex())
+        #bytes of checkpoint must be in file before checkpoint
+        self.file.flush()
+        save_checkpoint(self.path, self.state)
+
+    def tell(self):
+        return self.file.tell()
+
+    #finished file doesn't need checkpoint
+    def complete(self):
+        remove_checkpoint(self.path)
+        return True
+
+    def close(self):
+        self.file.close()
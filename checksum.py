@@ -0,0 +1,109 @@
+import binascii
+import zlib
+
+########################################################################################################################
+# CRC16-CCITT (poly 0x1021, initial value 0xFFFF, no reflection)
+CRC16_POLY = 0x1021
+CRC16_INIT = 0xFFFF
+
+
+#reference implementation, bit by bit (8 iterations per byte)
+def crc16_bitwise(data):
+    crc = CRC16_INIT
+    for byte in data:
+        #XOR
+        crc ^= (byte << 8)
+        for _ in range(8):
+            #checking first bite
+            if crc & 0x8000:
+                #moving one to left and then XOR
+                crc = (crc << 1) ^ CRC16_POLY
+            else:
+                crc <<= 1
+            #ensuring its 2B long
+            crc &= 0xFFFF
+    return crc
+
+
+#precomputing crc of every possible first byte
+def build_crc16_table():
+    table = []
+    for byte in range(256):
+        crc = byte << 8
+        for _ in range(8):
+            if crc & 0x8000:
+                crc = (crc << 1) ^ CRC16_POLY
+            else:
+                crc <<= 1
+            crc &= 0xFFFF
+        table.append(crc)
+    return tuple(table)
+
+
+CRC16_TABLE = build_crc16_table()
+
+
+#table driven implementation, one lookup per byte
+def crc16_table(data):
+    crc = CRC16_INIT
+    table = CRC16_TABLE
+    for byte in data:
+        crc = ((crc << 8) & 0xFFFF) ^ table[(crc >> 8) ^ byte]
+    return crc
+
+
+#C implementation, binascii.crc_hqx uses the same polynomial
+def crc16_hqx(data):
+    return binascii.crc_hqx(data, CRC16_INIT)
+
+
+#fastest available CRC16 backend is used by the protocol
+crc16_backends = {
+    'bitwise': crc16_bitwise,
+    'table': crc16_table, }
+if hasattr(binascii, 'crc_hqx'):
+    crc16_backends['hqx'] = crc16_hqx
+    crc16 = crc16_hqx
+else:
+    crc16 = crc16_table
+
+
+########################################################################################################################
+# 32-bit checksums
+def crc32(data):
+    return zlib.crc32(data)
+
+
+########################################################################################################################
+# checksum types, that can be negotiated during handshake
+# name -> (function, struct format of checksum field in header)
+checksum_types = {
+    'crc16': (crc16, 'H'),
+    'crc32': (crc32, 'I'), }
+
+DEFAULT_CHECKSUM = 'crc16'
+
+
+def get_checksum(data, checksum_type=DEFAULT_CHECKSUM):
+    if isinstance(data, str):
+        data = data.encode('utf-8')
+    return checksum_types[checksum_type][0](data)
+
+
+def checksum_format(checksum_type=DEFAULT_CHECKSUM):
+    return checksum_types[checksum_type][1]
+
+
+#offered checksums in order of preference, CRC16 is always supported
+def checksum_offer(preferred):
+    if preferred == DEFAULT_CHECKSUM or preferred not in checksum_types:
+        return [DEFAULT_CHECKSUM]
+    return [preferred, DEFAULT_CHECKSUM]
+
+
+#first checksum offered by peer, that is also offered locally
+def negotiate_checksum(peer_offer, local_offer):
+    for name in peer_offer:
+        if name in local_offer and name in checksum_types:
+            return name
+    return DEFAULT_CHECKSUM
@@ -0,0 +1,252 @@
+# transfers without GUI
+# send:    python cli.py send --local 0.0.0.0:5000 --peer 192.168.1.2:5001 --file a.bin --text "hello"
+# receive: python cli.py receive --local 0.0.0.0:5001 --download ./received
+# with several --peer options files and texts are distributed to all peers at once,
+# receive with --max-peers serves several peers from one socket, with --workers (Linux) from several processes
+# --stats prints metrics as JSON at the end, --stats-file keeps JSON snapshot of running node in file
+import argparse
+import asyncio
+import os
+import sys
+from functools import partial
+import checksum
+import compress
+import congestion
+import logger
+from engine import Engine, DEFAULT_SETTINGS, LARGEST_FRAGMENT_SIZE
+from metrics import to_json
+from workers import Coordinator, STATS_INTERVAL
+
+
+#address in form host:port
+def address(value):
+    host, _, port = value.rpartition(':')
+    if not host:
+        raise argparse.ArgumentTypeError(f"{value} is not in form host:port")
+    return host, int(port)
+
+
+def add_settings_arguments(parser):
+    parser.add_argument('--local', type=address, required=True, help="listening address host:port")
+    parser.add_argument('--download', default=DEFAULT_SETTINGS['download_address'], help="directory of received files")
+    parser.add_argument('--fragment-size', type=int, default=DEFAULT_SETTINGS['max_fragment_size'],
+                        help=f"1-{LARGEST_FRAGMENT_SIZE}B, 0 = by path MTU discovered after handshake")
+    parser.add_argument('--corruption', type=float, default=0.0, help="rate of simulated corruption(0-50%%)")
+    parser.add_argument('--checksum', choices=list(checksum.checksum_types), default=checksum.DEFAULT_CHECKSUM)
+    parser.add_argument('--congestion', choices=list(congestion.controllers), default=congestion.DEFAULT_CONTROLLER)
+    parser.add_argument('--rate', type=float, default=0, help="rate limit in KB/s, 0 = congestion control")
+    parser.add_argument('--burst', type=int, default=DEFAULT_SETTINGS['pacing_burst'], help="pacing burst in fragments")
+    parser.add_argument('--offload', choices=['on', 'off'], default='off', help="UDP GSO/GRO")
+    parser.add_argument('--window', type=int, default=0, help="largest window in fragments, 0 = by size of transfer")
+    parser.add_argument('--compression', choices=compress.choices, default='auto',
+                        help=f"codec of sent transfers up to {compress.MAX_SIZE // 2 ** 20}MB, "
+                             "auto = best codec supported by both peers")
+    parser.add_argument('--delta-sync', choices=['on', 'off'], default='on',
+                        help="send file again as differences from copy of peer")
+    parser.add_argument('--fec', default=DEFAULT_SETTINGS['fec'],
+                        help="parities of sent transfers: off, auto or K:m (m parities for every K fragments)")
+    parser.add_argument('--fast-start', choices=['on', 'off'], default=DEFAULT_SETTINGS['fast_start'],
+                        help="send first window of fragments without waiting for acknowledgement of parameters")
+    parser.add_argument('--ack-every', type=int, default=DEFAULT_SETTINGS['ack_every'],
+                        help="acknowledge every n fragments received in order, 1 = every fragment")
+    parser.add_argument('--ack-delay', type=int, default=DEFAULT_SETTINGS['ack_delay'],
+                        help="longest delay of acknowledgement in ms, 0-50")
+    parser.add_argument('--stats', action='store_true', help="print statistics as JSON at the end")
+    parser.add_argument('--stats-file', help="file rewritten every second with JSON statistics of running node")
+    parser.add_argument('-v', '--verbose', action='store_true', help="log every datagram, same as --log-level debug")
+    parser.add_argument('--log-level', choices=list(logger.levels), default='warning')
+    parser.add_argument('--log-sample', type=int, default=1, help="log every n-th fragment event")
+    parser.add_argument('--log-rate', type=int, help="log at most n fragment events per second")
+
+
+def settings_from(args):
+    return {
+        'download_address': args.download,
+        'max_fragment_size': args.fragment_size,
+        'corruption_rate': args.corruption,
+        'checksum': args.checksum,
+        'congestion_control': args.congestion,
+        #rate limit is entered in KB/s
+        'rate_limit': int(args.rate * 1000),
+        'pacing_burst': args.burst,
+        'udp_offload': args.offload,
+        'window_size': args.window,
+        'compression': args.compression,
+        'delta_sync': args.delta_sync,
+        'fec': args.fec,
+        'fast_start': args.fast_start,
+        'ack_every': args.ack_every,
+        'ack_delay': args.ack_delay}
+
+
+#per-packet events are sampled and rate limited
+def create_logger(args):
+    rate_limits = {'fragment': args.log_rate} if args.log_rate is not None else None
+    return logger.Logger('debug' if args.verbose else args.log_level, sampling={'fragment': args.log_sample},
+                         rate_limits=rate_limits)
+
+
+def create_engine(args, status=None, max_peers=1):
+    return Engine(args.local, output=lambda text: print(text, flush=True), status=status, logger=create_logger(args),
+                  max_peers=max_peers)
+
+
+def print_stats(args, engine):
+    if args.stats:
+        print(engine.export_json())
+
+
+#snapshot is written into temporary file and renamed, so reader never sees partly written file
+def write_stats(path, text):
+    temporary = f"{path}.tmp"
+    with open(temporary, 'w') as file:
+        file.write(text)
+    os.replace(temporary, path)
+
+
+#statistics of running engine are exported into file until task is cancelled
+async def export_stats(path, engine):
+    while True:
+        write_stats(path, engine.export_json())
+        await asyncio.sleep(STATS_INTERVAL)
+
+
+async def send_item(connection, kind, value):
+    if kind == 'file':
+        delivered = await connection.send_file(value)
+    else:
+        delivered = await connection.send_text(value)
+    if not delivered:
+        print(f"Not delivered: {value}", file=sys.stderr)
+    return delivered
+
+
+#texts and files are sent to one peer in given order or all at once in their own streams,
+#returns number of failed transfers
+async def send_to(args, connection):
+    if not await connection.connect():
+        return 1
+    if args.parallel:
+        results = await asyncio.gather(*(send_item(connection, kind, value) for kind, value in args.items))
+        failed = results.count(False)
+    else:
+        failed = 0
+        for kind, value in args.items:
+            if not await send_item(connection, kind, value):
+                failed += 1
+            if not connection.connected:
+                return failed + 1
+    if connection.connected:
+        await connection.disconnect()
+    return failed
+
+
+#every peer gets the same files and texts at once, exit code is number of failed transfers
+async def send(args):
+    engine = create_engine(args, max_peers=len(args.peer))
+    await engine.start()
+    exporter = asyncio.create_task(export_stats(args.stats_file, engine)) if args.stats_file else None
+    try:
+        engine.configure(settings_from(args))
+        results = await asyncio.gather(*(send_to(args, engine.connection(peer)) for peer in args.peer))
+        print_stats(args, engine)
+        return sum(results)
+    finally:
+        if exporter:
+            exporter.cancel()
+            write_stats(args.stats_file, engine.export_json())
+        await engine.close()
+        engine.logger.close()
+
+
+#receive daemon, any peer can connect, with --once it ends after all connected peers disconnect
+async def receive(args):
+    finished = asyncio.Event()
+    was_connected = False
+
+    def status(connected, sending):
+        nonlocal was_connected
+        if connected:
+            was_connected = True
+        elif was_connected and args.once:
+            finished.set()
+
+    engine = create_engine(args, status=status, max_peers=args.max_peers)
+    await engine.start()
+    exporter = asyncio.create_task(export_stats(args.stats_file, engine)) if args.stats_file else None
+    try:
+        engine.configure(settings_from(args))
+        print(f"Listening on {args.local[0]}:{args.local[1]}", flush=True)
+        await finished.wait()
+        print_stats(args, engine)
+        return 0
+    finally:
+        if exporter:
+            exporter.cancel()
+            write_stats(args.stats_file, engine.export_json())
+        await engine.close()
+        engine.logger.close()
+
+
+#receive daemon with worker processes sharing listening port, each serving up to max peers
+def receive_workers(args):
+    coordinator = Coordinator(args.local, settings_from(args), args.workers, args.max_peers,
+                              output=lambda text: print(text, flush=True), logger_factory=partial(create_logger, args))
+    coordinator.start()
+    try:
+        print(f"Listening on {args.local[0]}:{args.local[1]} with {args.workers} workers", flush=True)
+        was_connected = False
+        while True:
+            coordinator.poll(0.5)
+            if args.stats_file:
+                write_stats(args.stats_file, to_json(coordinator.stats()))
+            if coordinator.any_connected():
+                was_connected = True
+            elif was_connected and args.once:
+                break
+        if args.stats or args.stats_file:
+            #last statistics of workers
+            coordinator.poll(1.5)
+        if args.stats_file:
+            write_stats(args.stats_file, to_json(coordinator.stats()))
+        if args.stats:
+            print(to_json(coordinator.stats()))
+        return 0
+    finally:
+        coordinator.stop()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Peer to peer transfers over UDP without GUI")
+    commands = parser.add_subparsers(dest='command', required=True)
+    send_parser = commands.add_parser('send', help="connect to peer, send files and texts and disconnect")
+    add_settings_arguments(send_parser)
+    send_parser.add_argument('--peer', type=address, action='append', required=True,
+                             help="address of peer host:port, can be repeated")
+    send_parser.add_argument('--file', dest='items', action='append', type=lambda value: ('file', value), default=[])
+    send_parser.add_argument('--text', dest='items', action='append', type=lambda value: ('text', value))
+    send_parser.add_argument('--parallel', action='store_true', help="send all files and texts at once")
+    receive_parser = commands.add_parser('receive', help="wait for peers and save received files")
+    add_settings_arguments(receive_parser)
+    receive_parser.add_argument('--once', action='store_true', help="end after all connected peers disconnect")
+    receive_parser.add_argument('--max-peers', type=int, default=1, help="peers served at once by every worker")
+    receive_parser.add_argument('--workers', type=int, default=1, help="processes sharing listening port (Linux)")
+    args = parser.parse_args(argv)
+    try:
+        if args.command == 'send':
+            return asyncio.run(send(args))
+        if args.workers > 1:
+            return receive_workers(args)
+        return asyncio.run(receive(args))
+    except ValueError as e:
+        print(f"Wrong settings: {e}", file=sys.stderr)
+        return 2
+    except OSError as e:
+        print(e, file=sys.stderr)
+        return 1
+    except KeyboardInterrupt:
+        return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,109 @@
+import io
+import lzma
+import mmap
+import tempfile
+import zlib
+
+#zstd is optional, it is offered to peer only when zstandard package is installed
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+#content is compressed in chunks, so memory doesn't depend on size of file
+CHUNK_SIZE = 1024 * 1024
+#compressed content larger than this is kept in temporary file instead of memory
+SPOOL_SIZE = 4 * 1024 * 1024
+#content is sampled at start, middle and end, compression is skipped when samples don't shrink enough
+SAMPLE_SIZE = 64 * 1024
+MAX_RATIO = 0.9
+#smaller content isn't worth compressing
+MIN_SIZE = 512
+#content is compressed whole before parameters, which carry its compressed size, larger content is sent
+#uncompressed, so its first fragments are sent at once and it is streamed from file with bounded memory
+MAX_SIZE = 4 * 1024 * 1024
+#codec chosen by auto setting, the first one supported by both peers, lzma only when chosen explicitly
+AUTO_PREFERENCE = ('zstd', 'zlib')
+
+
+#codec name -> (compressor factory, decompressor factory)
+codecs = {
+    'zlib': (lambda: zlib.compressobj(6), zlib.decompressobj),
+    'lzma': (lambda: lzma.LZMACompressor(preset=6), lzma.LZMADecompressor)}
+if zstandard is not None:
+    codecs['zstd'] = (lambda: zstandard.ZstdCompressor(level=3).compressobj(),
+                      lambda: zstandard.ZstdDecompressor().decompressobj())
+
+#values of compression setting
+choices = ('auto', 'off') + tuple(codecs)
+
+
+#codec of transfer, negotiated is set of codecs supported by both peers
+def choose_codec(setting, negotiated):
+    if setting == 'auto':
+        return next((codec for codec in AUTO_PREFERENCE if codec in negotiated), None)
+    return setting if setting in negotiated and setting in codecs else None
+
+
+#ratio is estimated with fast zlib on samples, it is similar for every codec
+def worth_compressing(content):
+    size = len(content)
+    if size < MIN_SIZE or size > MAX_SIZE:
+        return False
+    offsets = {0, max(0, size // 2 - SAMPLE_SIZE // 2), max(0, size - SAMPLE_SIZE)}
+    sampled = compressed = 0
+    for offset in offsets:
+        sample = content[offset:offset + SAMPLE_SIZE]
+        sampled += len(sample)
+        compressed += len(zlib.compress(sample, 1))
+    return compressed <= MAX_RATIO * sampled
+
+
+def compressed_chunks(codec, content):
+    compressor = codecs[codec][0]()
+    for offset in range(0, len(content), CHUNK_SIZE):
+        yield compressor.compress(content[offset:offset + CHUNK_SIZE])
+    yield compressor.flush()
+
+
+#chunks are joined in memory, large result is moved into temporary file and memory-mapped,
+#so it can be sliced into fragments like file
+def spool(chunks):
+    output = io.BytesIO()
+    for chunk in chunks:
+        if isinstance(output, io.BytesIO) and output.tell() + len(chunk) > SPOOL_SIZE:
+            spooled = tempfile.TemporaryFile()
+            spooled.write(output.getbuffer())
+            output = spooled
+        output.write(chunk)
+    if isinstance(output, io.BytesIO):
+        return output.getvalue()
+    #mapping stays valid after temporary file is closed and deleted
+    with output:
+        output.flush()
+        return mmap.mmap(output.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+#content is compressed chunk by chunk
+def compress_content(codec, content):
+    return spool(compressed_chunks(codec, content))
+
+
+#sink of received transfer, fragments are decompressed as they are written in order,
+#so whole content is never held in memory
+class DecompressingSink:
+    def __init__(self, codec, sink):
+        self.decompressor = codecs[codec][1]()
+        self.sink = sink
+
+    def write(self, data):
+        self.sink.write(self.decompressor.decompress(data))
+
+    def tell(self):
+        return self.sink.tell()
+
+    def getvalue(self):
+        return self.sink.getvalue()
+
+    def close(self):
+        self.sink.close()
@@ -0,0 +1,143 @@
+import time
+
+#initial congestion window in fragments (RFC 6928)
+INITIAL_WINDOW = 10
+MIN_WINDOW = 2
+#window is spread over round trip faster than it is sent, so pacing doesn't limit growth
+SLOW_START_PACING_GAIN = 2.0
+PACING_GAIN = 1.25
+
+
+#congestion controller limits number of fragments in flight,
+#window is driven by acknowledgements and losses reported by the sender
+class CongestionController:
+    name = None
+
+    def __init__(self, max_window, clock=time.monotonic):
+        #window advertised in parameters is the upper limit
+        self.max_window = max(1, max_window)
+        self.clock = clock
+        self.cwnd = float(min(INITIAL_WINDOW, self.max_window))
+        self.ssthresh = float(self.max_window)
+        #losses of fragments sent before end of recovery belong to the same event
+        self.recovery_end = 0
+
+    #number of fragments, that can be in flight
+    def window(self):
+        return max(1, min(int(self.cwnd), self.max_window))
+
+    #rate in bytes per second, at which congestion window is sent during one round trip
+    def pacing_rate(self, srtt, fragment_bytes):
+        if not srtt:
+            return 0
+        gain = SLOW_START_PACING_GAIN if self.cwnd < self.ssthresh else PACING_GAIN
+        return gain * self.window() * fragment_bytes / srtt
+
+    #acked is number of newly acknowledged fragments
+    def on_ack(self, acked):
+        pass
+
+    #fragment frag_num was lost, highest_sent is the highest fragment sent so far
+    def on_loss(self, frag_num, highest_sent):
+        if frag_num < self.recovery_end:
+            return
+        self.recovery_end = highest_sent + 1
+        self.reduce()
+
+    def reduce(self):
+        pass
+
+    #nothing was acknowledged for retransmission timeout
+    def on_timeout(self, highest_sent):
+        self.recovery_end = highest_sent + 1
+        self.ssthresh = max(self.cwnd / 2, MIN_WINDOW)
+        self.cwnd = 1.0
+
+
+#window size fixed at advertised window
+class FixedWindow(CongestionController):
+    name = 'fixed'
+
+    def __init__(self, max_window, clock=time.monotonic):
+        super().__init__(max_window, clock)
+        self.cwnd = float(self.max_window)
+
+    def on_timeout(self, highest_sent):
+        self.recovery_end = highest_sent + 1
+
+
+#slow start, then additive increase and multiplicative decrease
+class Aimd(CongestionController):
+    name = 'aimd'
+
+    def on_ack(self, acked):
+        if self.cwnd < self.ssthresh:
+            #slow start, window doubles every round trip
+            self.cwnd += acked
+        else:
+            #congestion avoidance, one fragment every round trip
+            self.cwnd += acked / self.cwnd
+        self.cwnd = min(self.cwnd, self.max_window)
+
+    def reduce(self):
+        self.ssthresh = max(self.cwnd / 2, MIN_WINDOW)
+        self.cwnd = self.ssthresh
+
+
+#window grows as cubic function of time since last loss (RFC 8312)
+class Cubic(CongestionController):
+    name = 'cubic'
+    C = 0.4
+    BETA = 0.7
+
+    def __init__(self, max_window, clock=time.monotonic):
+        super().__init__(max_window, clock)
+        self.w_max = self.cwnd
+        self.k = 0.0
+        self.epoch_start = None
+        #window of standard AIMD for TCP friendly region
+        self.w_est = self.cwnd
+
+    def on_ack(self, acked):
+        if self.cwnd < self.ssthresh:
+            self.cwnd = min(self.cwnd + acked, self.max_window)
+            return
+        present_time = self.clock()
+        if self.epoch_start is None:
+            self.epoch_start = present_time
+            self.w_est = self.cwnd
+            if self.w_max > self.cwnd:
+                self.k = ((self.w_max - self.cwnd) / self.C) ** (1 / 3)
+            else:
+                self.k = 0.0
+                self.w_max = self.cwnd
+        t = present_time - self.epoch_start
+        target = self.C * (t - self.k) ** 3 + self.w_max
+        self.w_est += 3 * (1 - self.BETA) / (1 + self.BETA) * acked / self.cwnd
+        target = max(target, self.w_est)
+        if target > self.cwnd:
+            #window approaches target within one round trip
+            self.cwnd += (target - self.cwnd) / self.cwnd * acked
+        else:
+            self.cwnd += 0.01 * acked / self.cwnd
+        self.cwnd = min(self.cwnd, self.max_window)
+
+    def reduce(self):
+        self.epoch_start = None
+        self.w_max = self.cwnd
+        self.cwnd = max(self.cwnd * self.BETA, MIN_WINDOW)
+        self.ssthresh = self.cwnd
+
+    def on_timeout(self, highest_sent):
+        self.epoch_start = None
+        self.w_max = self.cwnd
+        super().on_timeout(highest_sent)
+
+
+controllers = {controller.name: controller for controller in (FixedWindow, Aimd, Cubic)}
+
+DEFAULT_CONTROLLER = 'aimd'
+
+
+def create_controller(name, max_window, clock=time.monotonic):
+    return controllers.get(name, controllers[DEFAULT_CONTROLLER])(max_window, clock)
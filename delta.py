@@ -0,0 +1,273 @@
+import hashlib
+import os
+import struct
+import zlib
+from compress import spool
+
+#files smaller than this are sent whole, block size grows with square root of size of file
+MIN_SIZE = 64 * 1024
+MIN_BLOCK = 2048
+MAX_BLOCK = 64 * 1024
+#unmatched bytes searched byte by byte, longer changed region is searched only at block boundaries,
+#so file unrelated to copy of receiver isn't searched byte by byte
+SEARCH_LIMIT = 1024 * 1024
+#literal data is sent in chunks, so delta is produced while file is read
+LITERAL_CHUNK = 1024 * 1024
+#weak checksum is Adler-32, which can be rolled by one byte
+ADLER_MOD = 65521
+
+#delta field of parameters, probe asks receiver for signatures of its copy of file,
+#signatures are sent back in transfer of receiver referring to stream of probe
+PROBE = '?'
+SIGNATURES = 'signatures'
+DELTA = 'delta'
+
+#signatures: block size, size of copy and weak and strong checksum of every block
+SIGNATURE_HEADER = struct.Struct('!IQ')
+SIGNATURE = struct.Struct('!I16s')
+#delta: copy of blocks of receiver's copy and literal data of sent file
+COPY = struct.Struct('!cII')
+LITERAL = struct.Struct('!cI')
+
+
+def block_size_for(size):
+    block_size = MIN_BLOCK
+    while block_size * block_size < size and block_size < MAX_BLOCK:
+        block_size *= 2
+    return block_size
+
+
+def strong_checksum(block):
+    return hashlib.blake2b(block, digest_size=16).digest()
+
+
+#signatures of blocks of file, the last block may be shorter
+def file_signatures(path):
+    size = os.path.getsize(path)
+    block_size = block_size_for(size)
+    signatures = [SIGNATURE_HEADER.pack(block_size, size)]
+    with open(path, 'rb') as file:
+        while True:
+            block = file.read(block_size)
+            if not block:
+                break
+            signatures.append(SIGNATURE.pack(zlib.adler32(block), strong_checksum(block)))
+    return b''.join(signatures)
+
+
+#block size, size of copy and blocks by weak checksum
+def parse_signatures(signatures):
+    block_size, size = SIGNATURE_HEADER.unpack_from(signatures)
+    blocks = {}
+    for index, (weak, strong) in enumerate(SIGNATURE.iter_unpack(signatures[SIGNATURE_HEADER.size:])):
+        blocks.setdefault(weak, []).append((index, strong))
+    return block_size, size, blocks
+
+
+#stream of probe, to which signatures belong
+def format_reference(stream):
+    return f"{SIGNATURES} {stream}"
+
+
+def parse_reference(field):
+    kind, _, stream = field.partition(' ')
+    return int(stream) if kind == SIGNATURES and stream.isdigit() else None
+
+
+def format_delta(block_size, digest):
+    return f"{DELTA} {block_size} {digest}"
+
+
+#block size and digest of file from delta field, None when field doesn't describe delta
+def parse_delta(field):
+    kind, _, rest = field.partition(' ')
+    block_size, _, digest = rest.partition(' ')
+    if kind != DELTA or not block_size.isdigit():
+        return None
+    return int(block_size), digest
+
+
+#block of receiver's copy with the same content, block following the previous copy is preferred
+def find_block(candidates, block, expected):
+    strong = strong_checksum(block)
+    found = None
+    for index, candidate in candidates:
+        if candidate == strong:
+            if index == expected:
+                return index
+            found = index if found is None else found
+    return found
+
+
+#instructions building content from copy of receiver, weak checksum of window is rolled byte by byte,
+#block with matching weak checksum is confirmed by strong one, counts of copied and literal bytes are in stats
+def delta_chunks(content, signatures, stats):
+    block_size, basis_size, blocks = parse_signatures(signatures)
+    last_block = (basis_size - 1) // block_size
+    size = len(content)
+    #start of literal data not sent yet and of unmatched region
+    literal = unmatched = 0
+    copy_start, copy_count = 0, 0
+    pos = 0
+    weak = None
+    while pos + block_size <= size:
+        if weak is None:
+            weak = zlib.adler32(content[pos:pos + block_size])
+        candidates = blocks.get(weak)
+        index = None
+        if candidates:
+            index = find_block(candidates, content[pos:pos + block_size], copy_start + copy_count)
+        #the last block of copy matches only if it is full
+        if index is not None and (index < last_block or basis_size % block_size == 0):
+            if pos > literal:
+                if copy_count:
+                    yield COPY.pack(b'C', copy_start, copy_count)
+                    copy_count = 0
+                yield LITERAL.pack(b'L', pos - literal)
+                yield content[literal:pos]
+                stats['literal'] += pos - literal
+            if copy_count and index == copy_start + copy_count:
+                copy_count += 1
+            else:
+                if copy_count:
+                    yield COPY.pack(b'C', copy_start, copy_count)
+                copy_start, copy_count = index, 1
+            stats['copied'] += block_size
+            pos += block_size
+            literal = unmatched = pos
+            weak = None
+            continue
+        if pos - literal >= LITERAL_CHUNK:
+            if copy_count:
+                yield COPY.pack(b'C', copy_start, copy_count)
+                copy_count = 0
+            yield LITERAL.pack(b'L', pos - literal)
+            yield content[literal:pos]
+            stats['literal'] += pos - literal
+            literal = pos
+        if pos - unmatched >= SEARCH_LIMIT:
+            pos += block_size
+            weak = None
+            continue
+        if pos + block_size < size:
+            out, new = content[pos], content[pos + block_size]
+            a = (weak & 0xffff) - out + new
+            b = ((weak >> 16) - block_size * out + a - 1) % ADLER_MOD
+            weak = (a % ADLER_MOD) | (b << 16)
+        pos += 1
+    #shorter last block of copy matches the end of content
+    tail = basis_size - last_block * block_size
+    if size - pos == tail < block_size and tail and (last_block, strong_checksum(content[pos:])) in \
+            blocks.get(zlib.adler32(content[pos:]), ()):
+        if pos > literal:
+            if copy_count:
+                yield COPY.pack(b'C', copy_start, copy_count)
+                copy_count = 0
+            yield LITERAL.pack(b'L', pos - literal)
+            yield content[literal:pos]
+            stats['literal'] += pos - literal
+        if copy_count and last_block == copy_start + copy_count:
+            copy_count += 1
+        else:
+            if copy_count:
+                yield COPY.pack(b'C', copy_start, copy_count)
+            copy_start, copy_count = last_block, 1
+        stats['copied'] += tail
+        literal = pos = size
+    if copy_count:
+        yield COPY.pack(b'C', copy_start, copy_count)
+    if size > literal:
+        yield LITERAL.pack(b'L', size - literal)
+        yield content[literal:]
+        stats['literal'] += size - literal
+
+
+#delta of content against signatures, returns (delta, delta field of parameters, stats),
+#field has block size and digest of content, which is compared with built file
+def encode_delta(content, signatures):
+    stats = {'copied': 0, 'literal': 0}
+    data = spool(delta_chunks(content, signatures, stats))
+    hasher = hashlib.sha256()
+    for offset in range(0, len(content), LITERAL_CHUNK):
+        hasher.update(content[offset:offset + LITERAL_CHUNK])
+    return data, format_delta(SIGNATURE_HEADER.unpack_from(signatures)[0], hasher.hexdigest()), stats
+
+
+#sink of delta, instructions are applied as they are written in order, file is built in temporary file
+#next to copy of receiver and replaces it only when its digest matches digest of sent file
+class DeltaSink:
+    def __init__(self, path, block_size, digest):
+        self.path = path
+        directory, name = os.path.split(path)
+        self.temporary = os.path.join(directory, f".{name}.delta")
+        self.basis = open(path, 'rb')
+        self.output = open(self.temporary, 'wb')
+        self.block_size = block_size
+        self.digest = digest
+        self.hasher = hashlib.sha256()
+        #incomplete instruction and remaining bytes of literal data
+        self.pending = b''
+        self.literal = 0
+        self.size = 0
+
+    def write(self, data):
+        if self.pending:
+            data = self.pending + data
+        view = memoryview(data)
+        pos = 0
+        while pos < len(view):
+            if self.literal:
+                chunk = view[pos:pos + self.literal]
+                self.emit(chunk)
+                self.literal -= len(chunk)
+                pos += len(chunk)
+            elif view[pos] == ord('L'):
+                if len(view) - pos < LITERAL.size:
+                    break
+                self.literal = LITERAL.unpack_from(view, pos)[1]
+                pos += LITERAL.size
+            elif view[pos] == ord('C'):
+                if len(view) - pos < COPY.size:
+                    break
+                _, first, count = COPY.unpack_from(view, pos)
+                self.copy(first, count)
+                pos += COPY.size
+            else:
+                raise ValueError("malformed delta")
+        self.pending = bytes(view[pos:])
+
+    def copy(self, first, count):
+        self.basis.seek(first * self.block_size)
+        remaining = count * self.block_size
+        while remaining > 0:
+            block = self.basis.read(min(remaining, LITERAL_CHUNK))
+            if not block:
+                break
+            self.emit(block)
+            remaining -= len(block)
+
+    def emit(self, data):
+        self.output.write(data)
+        self.hasher.update(data)
+        self.size += len(data)
+
+    def tell(self):
+        return self.size
+
+    #built file replaces copy only when it is complete and its digest matches
+    def complete(self):
+        valid = not self.pending and not self.literal and self.hasher.hexdigest() == self.digest
+        self.basis.close()
+        self.output.close()
+        if valid:
+            os.replace(self.temporary, self.path)
+        else:
+            os.remove(self.temporary)
+        return valid
+
+    #interrupted delta leaves copy of receiver unchanged
+    def close(self):
+        if not self.output.closed:
+            self.basis.close()
+            self.output.close()
+            os.remove(self.temporary)
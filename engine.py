@@ -0,0 +1,2156 @@
+import asyncio
+import collections
+import io
+import mmap
+import os
+import random
+import socket
+import struct
+import time
+import checkpoint
+import checksum
+import compress
+import congestion
+import delta
+import fec
+import gso
+import logger
+import pmtu
+from logger import Logger
+from metrics import Metrics, to_json
+from rtt import RttEstimator
+from pacing import TokenBucket
+from reorder import ReorderBuffer, decode_sack
+
+flags_types = {
+    # Handshake flags
+    'FLAG_HS1': 0b10000000,
+    'FLAG_HS2': 0b10001000,
+    'FLAG_HS3': 0b10001001,
+    # Exit flags
+    'FLAG_EXIT': 0b01000000,
+    'FLAG_EXIT_ACK': 0b01001000,
+    # Keepalive flags
+    'FLAG_KEEPALIVE': 0b00100000,
+    'FLAG_KEEPALIVE_ACK': 0b00101000,
+    # Path MTU probe flags
+    'FLAG_PROBE': 0b00100001,
+    'FLAG_PROBE_ACK': 0b00101001,
+    # Message flags
+    'FLAG_MSG': 0b00010010,
+    'FLAG_MSG_ACK': 0b00011010,
+    'FLAG_MSG_REQ': 0b00010110,
+    'FLAG_MSG_PAR': 0b10010010,
+    'FLAG_MSG_PAR_ACK': 0b10011010,
+    'FLAG_MSG_PAR_REQ': 0b10010110,
+    'FLAG_MSG_PAR_REJ': 0b10011110,
+    'FLAG_MSG_FRAG': 0b00010011,
+    # Data(file) flags
+    'FLAG_DATA_PAR': 0b10010000,
+    'FLAG_DATA_PAR_ACK': 0b10011000,
+    'FLAG_DATA_PAR_REQ': 0b10010100,
+    'FLAG_DATA_PAR_REJ': 0b10011100,
+    'FLAG_DATA': 0b00010000,
+    'FLAG_DATA_ACK': 0b00011000,
+    'FLAG_DATA_REQ': 0b00010100, }
+
+handshake_flags = (flags_types['FLAG_HS1'], flags_types['FLAG_HS2'], flags_types['FLAG_HS3'])
+parameter_flags = (flags_types['FLAG_MSG_PAR'], flags_types['FLAG_DATA_PAR'])
+
+#parameters flag -> (acknowledgement flag, request flag, reject flag), parameters which receiver can't accept
+#are rejected, so sender doesn't send them again
+parameter_replies = {
+    flags_types['FLAG_MSG_PAR']: (flags_types['FLAG_MSG_PAR_ACK'], flags_types['FLAG_MSG_PAR_REQ'],
+                                  flags_types['FLAG_MSG_PAR_REJ']),
+    flags_types['FLAG_DATA_PAR']: (flags_types['FLAG_DATA_PAR_ACK'], flags_types['FLAG_DATA_PAR_REQ'],
+                                   flags_types['FLAG_DATA_PAR_REJ'])}
+reject_flags = tuple(replies[2] for replies in parameter_replies.values())
+#fragment flag -> parameters flag of its transfer
+transfer_parameters = {flags_types['FLAG_MSG_FRAG']: flags_types['FLAG_MSG_PAR'],
+                       flags_types['FLAG_DATA']: flags_types['FLAG_DATA_PAR']}
+
+#fragment flag -> (acknowledgement flag, request flag)
+fragment_replies = {
+    flags_types['FLAG_MSG_FRAG']: (flags_types['FLAG_MSG_ACK'], flags_types['FLAG_MSG_REQ']),
+    flags_types['FLAG_DATA']: (flags_types['FLAG_DATA_ACK'], flags_types['FLAG_DATA_REQ'])}
+
+#idle time after which keepalive is sent
+KEEPALIVE_INTERVAL = 5
+#number of retransmission timeouts without any message, after which peer is checked during transfer
+INACTIVITY_RTOS = 8
+#tries of handshake, parameters, exit and keepalive
+TRIES = 3
+#out of order fragments received after request, before request is sent again
+REQUEST_INTERVAL = 15
+#largest header, used for sizes of datagrams
+HEADER_SIZE = 13
+#fragment size before path MTU is discovered, 1449 so total msg is no longer than 1500
+MAX_FRAGMENT_SIZE = 1449
+#fragment of the largest UDP datagram, parity of FEC carries fragment together with its own header
+LARGEST_FRAGMENT_SIZE = pmtu.MAX_DATAGRAM - HEADER_SIZE - fec.PARITY_HEADER.size
+#longest time sender runs without processing received acknowledgements
+YIELD_INTERVAL = 0.002
+#increased buffers to avoid message lose
+SOCKET_BUFFER = 8 * 1024 * 1024
+#optional features offered in HS1 after checksums, peer enables those offered by both sides,
+#compression codecs are offered as features, so only codecs available on both sides are used
+FEATURES = ('streams', 'resume', 'delta', 'fec', 'pmtu', 'faststart') + tuple(compress.codecs)
+#highest stream identifier, stream 0 is used by peers without streams and by connection messages
+MAX_STREAM = 65535
+#finished incoming streams remembered, so their lost last acknowledgement can be sent again
+COMPLETED_STREAMS = 64
+#bytes of fast start fragments received before parameters of their transfer, kept by connection
+EARLY_BUFFER = 4 * 1024 * 1024
+#longest delay of acknowledgement in ms, half of minimum retransmission timeout
+MAX_ACK_DELAY = 50
+#congestion window shared by all streams, every stream is also limited by window of receiver
+MAX_WINDOW = 65535
+#summaries of last finished transfers kept by engine
+RECENT_TRANSFERS = 16
+
+DEFAULT_SETTINGS = {
+    'download_address': '.',
+    #0 = fragment size of every peer is derived from path MTU discovered after handshake
+    'max_fragment_size': 0,
+    'corruption_rate': 0.0,
+    'checksum': checksum.DEFAULT_CHECKSUM,
+    'congestion_control': congestion.DEFAULT_CONTROLLER,
+    #sending rate limit in bytes per second (0 = rate given by congestion control) and burst in fragments
+    'rate_limit': 0,
+    'pacing_burst': congestion.INITIAL_WINDOW,
+    #UDP segmentation offload (Linux), several fragments are sent and received in one system call
+    'udp_offload': 'off',
+    #largest window of transfer advertised to receiver in fragments, 0 = derived from number of fragments
+    'window_size': 0,
+    #codec of sent transfers (auto/off/zlib/lzma/zstd), auto chooses the best codec supported by both peers,
+    #received transfers are decompressed with codec chosen by sender, larger transfers than compress.MAX_SIZE
+    #are sent uncompressed
+    'compression': 'auto',
+    #file sent again to the same peer is sent as differences from its copy (on/off)
+    'delta_sync': 'on',
+    #parity fragments of sent transfers (off/auto/K:m), m parities are added to every group of K fragments,
+    #so receiver rebuilds lost fragments without request, auto adapts m to loss rate reported by receiver
+    'fec': 'off',
+    #first window of fragments follows parameters without waiting for their acknowledgement (on/off)
+    'fast_start': 'on',
+    #fragments received in order are acknowledged by one ACK, when ack_every of them arrive or after ack_delay
+    #in ms, gap and the end of transfer are acknowledged at once, ack_every 1 acknowledges every fragment
+    'ack_every': 2,
+    'ack_delay': 10}
+
+
+########################################################################################################################
+#message operations
+#handshake is always protected with CRC16, the rest with negotiated checksum
+def frame_checksum_type(flags, checksum_type):
+    if flags in handshake_flags:
+        return checksum.DEFAULT_CHECKSUM
+    return checksum_type
+
+
+#header format for given flags, with streams negotiated stream identifier follows checksum,
+#handshake has no stream identifier
+def header_format_for(flags, checksum_type, streams=False):
+    header_format = '!B I H ' + checksum.checksum_format(frame_checksum_type(flags, checksum_type))
+    if streams and flags not in handshake_flags:
+        header_format += ' H'
+    return header_format
+
+
+#encoding message based on my protocol, stream None means header without stream identifier
+def encode_message(flags, frag_num, window_size, data, checksum_type=checksum.DEFAULT_CHECKSUM, corruption_rate=0,
+                   stream=None):
+    if isinstance(data, str):
+        data = data.encode('utf-8')
+    elif data is None:
+        data = b''
+    header_format = header_format_for(flags, checksum_type, stream is not None)
+    checksum_value = checksum.get_checksum(data, frame_checksum_type(flags, checksum_type))
+    #simulating corruption of message
+    if corruption_rate != 0:
+        if data and random.uniform(0, 100) < corruption_rate:
+            corrupt_byte_index = random.randint(0, len(data) - 1)
+            corrupted_byte = random.randint(0, 255)
+            while data[corrupt_byte_index] == corrupted_byte:
+                corrupted_byte = random.randint(0, 255)
+            data = data[:corrupt_byte_index] + bytes([corrupted_byte]) + data[corrupt_byte_index + 1:]
+    if stream is not None and flags not in handshake_flags:
+        header = struct.pack(header_format, flags, frag_num, window_size, checksum_value, stream)
+    else:
+        header = struct.pack(header_format, flags, frag_num, window_size, checksum_value)
+    return header + data
+
+
+#decoding message based on my protocol
+def decode_message(msg, checksum_type=checksum.DEFAULT_CHECKSUM, streams=False):
+    header_format = header_format_for(msg[0], checksum_type, streams)
+    header_size = struct.calcsize(header_format)
+    flags, frag_num, window_size, checksum_value, *stream = struct.unpack(header_format, msg[:header_size])
+    data = msg[header_size:]
+    return {
+        'flags': flags,
+        'fragment_number': frag_num,
+        'window_size': window_size,
+        'checksum': checksum_value,
+        'checksum_type': frame_checksum_type(flags, checksum_type),
+        'stream': stream[0] if stream else 0,
+        'size': len(msg),
+        'data': data}
+
+
+#features of HS1 or HS2 enabled by this side, unknown ones are ignored
+def negotiate_features(tokens):
+    return {feature for feature in FEATURES if feature in tokens}
+
+
+#window size should be less than half of fragment number, limit from settings makes it smaller
+def advertised_window(last_fragment, limit=0):
+    if last_fragment / 2 >= 65535:
+        window = 65535
+    else:
+        window = max(1, last_fragment // 2)
+    return min(window, limit) if limit else window
+
+
+#name of file, codec of its content, identity of file, resume point, delta and FEC group size are sent in data
+#of parameters, separated by zero byte, which can't be in name, text has empty name, missing fields are empty,
+#so peer without compression, resume, delta and FEC sends only name
+def parameters_data(name, codec, identity='', resume='', changes='', fec_group=0):
+    return '\0'.join((name, codec or '', identity, resume, changes, str(fec_group or ''))).rstrip('\0')
+
+
+def parse_parameters_data(data):
+    name, codec, identity, resume, changes, fec_group = \
+        (data.decode('utf-8', 'replace').split('\0') + [''] * 5)[:6]
+    return name, codec or None, identity, resume, changes, int(fec_group) if fec_group.isdigit() else 0
+
+
+#file is memory-mapped, so only fragments in the window are read, resumed file is mapped from offset,
+#which is multiple of checkpoint block
+def open_file_content(file_path, offset=0):
+    with open(file_path, 'rb') as file:
+        #empty file can't be mapped
+        if os.fstat(file.fileno()).st_size <= offset:
+            return b''
+        return mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ, offset=offset)
+
+
+#fragment size of datagram of discovered size, parity of FEC carries fragment together with its own header
+def fragment_size_for(datagram_size):
+    return datagram_size - HEADER_SIZE - fec.PARITY_HEADER.size
+
+
+#slice of content belonging to fragment
+def get_fragment(content, i, last_fragment_number, fragment_size):
+    if i == last_fragment_number:
+        return content[i * fragment_size:]
+    return content[i * fragment_size:(i + 1) * fragment_size]
+
+
+#join of download address and name of received file, directories in name sent by peer are ignored,
+#name, which doesn't name a file in download address, raises ValueError
+def download_path(download_address, name):
+    name = os.path.basename(name.replace("\\", "/"))
+    if name in ('', '.', '..'):
+        raise ValueError(f"invalid file name '{name}'")
+    return os.path.join(download_address, name)
+
+
+#summary of finished transfer with its metrics, goodput counts delivered content,
+#throughput every byte of fragments sent or received with headers, retransmissions and duplicates
+#size is size of content before compression, offset is size of prefix saved by interrupted transfer
+def transfer_stats(direction, size, last_fragment_number, seconds, metrics, codec=None, offset=0):
+    stats = {
+        'direction': direction,
+        'bytes': size,
+        'fragments': last_fragment_number + 1,
+        'seconds': seconds,
+        'goodput': size / seconds if seconds else 0.0,
+        'throughput': metrics.counters['fragment_bytes_' + direction] / seconds if seconds else 0.0,
+        'retransmissions': metrics.counters['fragments_retransmitted'],
+        'compression': codec,
+        'resumed_from': offset}
+    stats.update(metrics.snapshot())
+    return stats
+
+
+#time without any message, after which peer is checked with keepalive
+def inactivity_timeout(rtt):
+    return min(INACTIVITY_RTOS * rtt.timeout(), KEEPALIVE_INTERVAL)
+
+
+#settings are checked before they are used, wrong value raises ValueError
+def validate_settings(settings):
+    if not 0 <= settings['max_fragment_size'] <= LARGEST_FRAGMENT_SIZE:
+        raise ValueError(f"fragment size must be between 1 and {LARGEST_FRAGMENT_SIZE} or 0 for path MTU")
+    if not 0 <= settings['corruption_rate'] <= 50:
+        raise ValueError("corruption rate must be between 0 and 50")
+    if settings['rate_limit'] < 0 or settings['pacing_burst'] < 1:
+        raise ValueError("rate limit can't be negative and pacing burst must be at least 1")
+    if not os.path.isdir(settings['download_address']):
+        raise ValueError(f"{settings['download_address']} is not a directory")
+    if settings['checksum'] not in checksum.checksum_types:
+        raise ValueError(f"unknown checksum {settings['checksum']}")
+    if settings['congestion_control'] not in congestion.controllers:
+        raise ValueError(f"unknown congestion control {settings['congestion_control']}")
+    if settings['udp_offload'] not in ('on', 'off'):
+        raise ValueError("UDP offload must be on or off")
+    if not 0 <= settings['window_size'] <= 65535:
+        raise ValueError("window size must be between 0 and 65535")
+    if settings['compression'] not in compress.choices:
+        raise ValueError(f"unknown compression {settings['compression']}")
+    if settings['delta_sync'] not in ('on', 'off'):
+        raise ValueError("delta sync must be on or off")
+    try:
+        fec.parse_setting(settings['fec'])
+    except ValueError:
+        raise ValueError(f"FEC must be off, auto or K:m with K up to {fec.MAX_GROUP} and m up to {fec.MAX_PARITY}")
+    if settings['fast_start'] not in ('on', 'off'):
+        raise ValueError("fast start must be on or off")
+    if not 1 <= settings['ack_every'] <= MAX_WINDOW:
+        raise ValueError(f"ACK every must be between 1 and {MAX_WINDOW} fragments")
+    if not 0 <= settings['ack_delay'] <= MAX_ACK_DELAY:
+        raise ValueError(f"ACK delay must be between 0 and {MAX_ACK_DELAY}ms")
+
+
+########################################################################################################################
+#sending fragments of content of one stream with sliding window limited by window of receiver,
+#fragments are encoded when they enter window and released when acknowledged,
+#fragments of all streams are sent by scheduler of connection,
+#with FEC (group size, parities or None for auto) parities follow the first sending of every group
+class OutgoingTransfer:
+    def __init__(self, connection, stream, flag, content, fragment_size, last_fragment_number, window_size,
+                 fec_setting=None):
+        self.connection = connection
+        self.stream = stream
+        self.flag = flag
+        self.content = content
+        self.fragment_size = fragment_size
+        self.last_fragment_number = last_fragment_number
+        self.window_size = window_size
+        self.fec_group, self.fec_parity = fec_setting or (0, None)
+        #loss rate reported by receiver in acknowledgements, auto FEC starts with rate of previous transfer
+        self.peer_loss = connection.fec_loss
+        #first fragment not delivered and next fragment to send
+        self.sf = 0
+        self.next_fragment = 0
+        #highest fragment sent so far, fragments before it are retransmitted
+        self.highest_sent = -1
+        #time of sending of fragments sent only once
+        self.sent_times = {}
+        #sequence number of last sending of fragment, losses are reported to controller in order of sending
+        self.sequences = {}
+        #fragments received by peer out of order and time of their last retransmission
+        self.sacked = set()
+        self.retransmitted = {}
+        self.encoded_fragments = {}
+        self.released = 0
+        self.start_time = self.last_progress = time.monotonic()
+        #counters and histograms of this transfer, merged into connection when transfer ends,
+        #they are updated for every fragment, so they are used directly
+        self.metrics = Metrics()
+        self.counters = self.metrics.counters
+        self.rtt_samples = self.metrics.histogram('rtt')
+        self.occupancy = self.metrics.histogram('window_occupancy')
+        #True when every fragment is acknowledged, False when connection is lost
+        self.done = asyncio.get_running_loop().create_future()
+
+    def fragment(self, i):
+        return get_fragment(self.content, i, self.last_fragment_number, self.fragment_size)
+
+    def encode(self, i, window_size):
+        return self.connection.encode(self.flag, i, window_size, self.fragment(i), self.stream)
+
+    #fragment requested by peer is sent again
+    def retransmit(self, frag_num):
+        scheduler = self.connection.scheduler
+        #acknowledgement of retransmitted fragment can't be sampled
+        self.sent_times.pop(frag_num, None)
+        encoded = self.encode(frag_num, 0)
+        #retransmission is sent at once, but takes tokens of next fragments
+        scheduler.pacer.consume(len(encoded))
+        self.sequences[frag_num] = scheduler.next_sequence(1)
+        self.connection.send(encoded)
+        self.counters['fragments_sent'] += 1
+        self.counters['fragments_retransmitted'] += 1
+        self.counters['fragment_bytes_sent'] += len(encoded)
+        self.retransmitted[frag_num] = time.monotonic()
+        self.connection.logger.debug('fragment', "sent fragment\t\t\t\t{}:{}", self.stream, frag_num)
+
+    #parities of groups completed by fragments sent for the first time, they are sent once and never acknowledged,
+    #the last group is announced even without parities, so receiver doesn't wait for them
+    def send_parities(self, previous, highest):
+        for group in range((previous + 1) // self.fec_group, highest // self.fec_group + 1):
+            first = group * self.fec_group
+            end = min(first + self.fec_group - 1, self.last_fragment_number)
+            if end > highest:
+                return
+            count = self.fec_parity
+            if count is None:
+                count = fec.parity_for_loss(self.peer_loss, self.fec_group)
+            if count or end == self.last_fragment_number:
+                fragments = [self.fragment(i) for i in range(first, end + 1)]
+                header = fec.PARITY_HEADER.pack(count, len(fragments[-1]))
+                for j, parity in enumerate(fec.encode_parity(fragments, count) or [b'']):
+                    encoded = self.connection.encode(self.flag, fec.parity_number(self.last_fragment_number, group, j),
+                                                     self.window_size, header + parity, self.stream)
+                    self.connection.scheduler.pacer.consume(len(encoded))
+                    self.connection.send(encoded)
+                    self.counters['fec_parities_sent'] += 1
+                    self.counters['fragment_bytes_sent'] += len(encoded)
+
+    #cumulative acknowledgement moves window and opens congestion window
+    def acknowledge(self, ack_number):
+        if ack_number + 1 <= self.sf:
+            return
+        acked = ack_number + 1 - self.sf
+        #RTT is sampled from fragment, which was sent only once
+        sent = self.sent_times.get(ack_number)
+        if sent is not None:
+            rtt = time.monotonic() - sent
+            self.connection.rtt.sample(rtt)
+            self.rtt_samples.observe(rtt)
+        for i in range(self.sf, ack_number + 1):
+            self.sent_times.pop(i, None)
+            self.sequences.pop(i, None)
+        self.sf = ack_number + 1
+        #acknowledged fragments are forgotten, selectively acknowledged ones were already counted
+        if self.sacked:
+            acked -= sum(1 for i in self.sacked if i < self.sf)
+            self.sacked = {i for i in self.sacked if i >= self.sf}
+        if self.retransmitted:
+            self.retransmitted = {i: sent for i, sent in self.retransmitted.items() if i >= self.sf}
+        self.connection.scheduler.controller.on_ack(acked)
+        self.last_progress = time.monotonic()
+        self.connection.scheduler.wake()
+
+    #fragments received by peer out of order aren't sent again,
+    #every hole before the last of them is retransmitted in one pass,
+    #with FEC holes are rebuilt by receiver, they are retransmitted only when receiver requests them
+    def process_sack(self, first_missing, bitmap, requested=False):
+        received = [i for i in decode_sack(first_missing, bitmap) if i not in self.sacked and i >= self.sf]
+        if not received:
+            return
+        scheduler = self.connection.scheduler
+        self.sacked.update(received)
+        scheduler.controller.on_ack(len(received))
+        present_time = time.monotonic()
+        self.last_progress = present_time
+        if self.fec_group and not requested:
+            scheduler.wake()
+            return
+        for frag_num in range(max(first_missing, self.sf), min(max(self.sacked), self.last_fragment_number + 1)):
+            #hole retransmitted recently is still on the way
+            if frag_num not in self.sacked and \
+                    present_time - self.retransmitted.get(frag_num, 0) > self.connection.rtt.smoothed():
+                #hole means loss, congestion window is reduced once per window of data
+                scheduler.controller.on_loss(self.sequences.get(frag_num, scheduler.sequence), scheduler.sequence - 1)
+                self.retransmit(frag_num)
+        scheduler.wake()
+
+    #acknowledgement or request of peer, corrupted ones are ignored and fragments are sent again later
+    def on_reply(self, msg, correct):
+        if not correct:
+            return
+        ack_flag, req_flag = fragment_replies[self.flag]
+        frag_num = msg['fragment_number']
+        #receiver with FEC reports its loss rate in window of replies
+        if self.fec_group:
+            self.peer_loss = msg['window_size'] / fec.LOSS_SCALE
+        #if request send fragment again, acknowledged fragments aren't resent
+        if msg['flags'] == req_flag:
+            self.counters['reqs_received'] += 1
+            self.connection.logger.debug('fragment', "received fragment REQ\t\t{}:{}", self.stream, frag_num)
+            if self.sf <= frag_num <= self.last_fragment_number:
+                self.retransmit(frag_num)
+            self.process_sack(frag_num, msg['data'], True)
+        #when ack update sf and retransmit holes from selective acknowledgement
+        elif msg['flags'] == ack_flag:
+            self.counters['acks_received'] += 1
+            self.connection.logger.debug('fragment', "received fragment ACK\t\t{}:{}", self.stream, frag_num)
+            self.acknowledge(frag_num)
+            self.process_sack(frag_num + 1, msg['data'])
+
+    #window is moved before scheduler picks stream,
+    #returns True when nothing was acknowledged for retransmission timeout
+    def prepare(self, present_time):
+        #acknowledged fragments are not needed anymore
+        while self.released < self.sf:
+            self.encoded_fragments.pop(self.released, None)
+            self.released += 1
+        timed_out = False
+        #fragments are sent again from first not delivered
+        if self.next_fragment > self.sf and present_time - self.last_progress > self.connection.rtt.timeout():
+            self.connection.logger.debug('timeout', "timeout\t\t\t\t\t{}:{}", self.stream, self.sf)
+            self.next_fragment = self.sf
+            self.last_progress = present_time
+            self.counters['timeouts'] += 1
+            timed_out = True
+        self.next_fragment = max(self.next_fragment, self.sf)
+        #fragments received by peer out of order are skipped
+        while self.next_fragment in self.sacked:
+            self.next_fragment += 1
+        return timed_out
+
+    def in_flight(self):
+        in_flight = self.next_fragment - self.sf
+        if self.sacked:
+            in_flight -= sum(1 for i in self.sacked if i < self.next_fragment)
+        return in_flight
+
+    #next fragment is in window of receiver
+    def ready(self):
+        return self.next_fragment <= self.last_fragment_number and self.next_fragment < self.sf + self.window_size
+
+    #time until retransmission timeout of fragments in flight
+    def until_timeout(self, present_time):
+        return self.connection.rtt.timeout() - (present_time - self.last_progress)
+
+    #next fragments allowed by windows, room is free part of congestion window,
+    #with GSO consecutive fragments are sent together, at most one pacing burst
+    def next_batch(self, room):
+        limit = 1
+        if self.connection.gso_enabled:
+            limit = min(room, self.sf + self.window_size - self.next_fragment, self.connection.settings['pacing_burst'],
+                        gso.max_segments(self.fragment_size + HEADER_SIZE))
+        batch = []
+        i = self.next_fragment
+        while len(batch) < limit and i <= self.last_fragment_number and i not in self.sacked:
+            encoded = self.encoded_fragments.get(i)
+            if encoded is None:
+                encoded = self.encode(i, self.window_size)
+                self.encoded_fragments[i] = encoded
+            #datagrams of one batch have the same size, only the last one can be shorter
+            if batch and len(encoded) > len(batch[0]):
+                break
+            batch.append(encoded)
+            i += 1
+            if len(encoded) < len(batch[0]):
+                break
+        return batch
+
+    #size is number of bytes of batch, fragments sent again after timeout are retransmissions
+    def send_batch(self, batch, size, present_time):
+        sequence = self.connection.scheduler.next_sequence(len(batch))
+        previous = self.highest_sent
+        retransmitted = 0
+        for i in range(self.next_fragment, self.next_fragment + len(batch)):
+            if i > self.highest_sent:
+                self.sent_times[i] = present_time
+                self.highest_sent = i
+            else:
+                self.sent_times.pop(i, None)
+                retransmitted += 1
+            self.sequences[i] = sequence
+            sequence += 1
+        self.connection.send_batch(batch, size)
+        if self.fec_group and self.highest_sent > previous:
+            self.send_parities(previous, self.highest_sent)
+        counters = self.counters
+        counters['fragments_sent'] += len(batch)
+        counters['fragment_bytes_sent'] += size
+        if retransmitted:
+            counters['fragments_retransmitted'] += retransmitted
+        #fragments between first not delivered and last sent
+        self.occupancy.observe(self.next_fragment + len(batch) - self.sf)
+        if self.connection.logger.enabled(logger.DEBUG):
+            for i in range(self.next_fragment, self.next_fragment + len(batch)):
+                self.connection.logger.debug('fragment', "sent fragment\t\t\t\t{}:{}", self.stream, i)
+        self.next_fragment += len(batch)
+
+    #live metrics of running transfer
+    def stats(self):
+        stats = {'stream': self.stream, 'direction': 'sent', 'fragments': self.last_fragment_number + 1,
+                 'delivered': self.sf, 'seconds': time.monotonic() - self.start_time}
+        stats.update(self.metrics.snapshot())
+        return stats
+
+    #transfer leaves scheduler
+    def finish(self, delivered):
+        if self.fec_group:
+            self.connection.fec_loss = self.peer_loss
+        if self.connection.outgoing.get(self.stream) is self:
+            del self.connection.outgoing[self.stream]
+            self.connection.metrics.merge(self.metrics)
+        self.encoded_fragments = {}
+        if not self.done.done():
+            self.done.set_result(delivered)
+
+
+########################################################################################################################
+#fragments of all outgoing streams share one congestion window and pacer,
+#streams with fragment ready to send take turns, one batch each, so concurrent transfers share bandwidth
+class Scheduler:
+    def __init__(self, connection):
+        self.connection = connection
+        settings = connection.settings
+        self.controller = congestion.create_controller(settings['congestion_control'], MAX_WINDOW)
+        #datagrams are spaced by token bucket
+        self.pacer = TokenBucket(settings['rate_limit'],
+                                 settings['pacing_burst'] * (connection.fragment_size + HEADER_SIZE))
+        #sequence number of next sent fragment of any stream
+        self.sequence = 0
+        self.last_timeout = 0
+        #scheduler sleeps on future until acknowledgement opens window or timer expires
+        self.waiter = None
+
+    def wake(self):
+        if self.waiter is not None and not self.waiter.done():
+            self.waiter.set_result(None)
+
+    async def sleep(self, timeout):
+        loop = asyncio.get_running_loop()
+        self.waiter = loop.create_future()
+        timer = loop.call_later(timeout, self.wake)
+        try:
+            await self.waiter
+        finally:
+            timer.cancel()
+            self.waiter = None
+
+    #sequence numbers of count fragments about to be sent
+    def next_sequence(self, count):
+        sequence = self.sequence
+        self.sequence += count
+        return sequence
+
+    #streams timing out together are one congestion event
+    def on_timeout(self, present_time):
+        if present_time - self.last_timeout > self.connection.rtt.timeout():
+            self.connection.rtt.on_timeout()
+            self.controller.on_timeout(self.sequence - 1)
+            self.last_timeout = present_time
+
+    #runs until every stream is finished, transfers are ended with False when connection is lost
+    async def run(self):
+        connection = self.connection
+        rtt = connection.rtt
+        rate_limit = connection.settings['rate_limit']
+        last_yield = time.monotonic()
+        while connection.outgoing:
+            if not connection.connected:
+                for transfer in list(connection.outgoing.values()):
+                    transfer.finish(False)
+                return
+            present_time = time.monotonic()
+            in_flight = 0
+            ready = None
+            wait = rtt.timeout()
+            for transfer in list(connection.outgoing.values()):
+                if transfer.sf > transfer.last_fragment_number:
+                    transfer.finish(True)
+                    continue
+                if transfer.prepare(present_time):
+                    self.on_timeout(present_time)
+                stream_in_flight = transfer.in_flight()
+                in_flight += stream_in_flight
+                if stream_in_flight:
+                    wait = min(wait, transfer.until_timeout(present_time))
+                if ready is None and transfer.ready():
+                    ready = transfer
+            if ready is None or in_flight >= self.controller.window():
+                #wait for acknowledgement or retransmission timeout
+                if connection.outgoing:
+                    await self.sleep(max(0.001, wait))
+                continue
+            batch = ready.next_batch(self.controller.window() - in_flight)
+            size = sum(len(encoded) for encoded in batch)
+            #without rate limit fragments are paced by congestion window spread over round trip
+            if not rate_limit:
+                self.pacer.set_rate(self.controller.pacing_rate(rtt.srtt, len(batch[0])))
+            delay = self.pacer.delay(size)
+            if delay > 0:
+                await self.sleep(delay)
+                continue
+            self.pacer.consume(size)
+            ready.send_batch(batch, size, present_time)
+            #stream which sent moves behind the others
+            connection.outgoing[ready.stream] = connection.outgoing.pop(ready.stream)
+            #acknowledgements are processed between bursts of sending
+            if present_time - last_yield > YIELD_INTERVAL:
+                await asyncio.sleep(0)
+                last_yield = time.monotonic()
+
+
+########################################################################################################################
+#receiving fragments of one stream into sink, out of order fragments are kept in window,
+#with FEC group size lost fragments are rebuilt from parities, holes are requested only when group can't be rebuilt
+class IncomingTransfer:
+    def __init__(self, connection, stream, flag, last_fragment_number, window_size, sink, address=None, codec=None,
+                 offset=0, saved=None, fec_group=0):
+        self.connection = connection
+        self.logger = connection.logger
+        self.stream = stream
+        self.flag = flag
+        self.last_fragment_number = last_fragment_number
+        self.sink = sink
+        #path of received file
+        self.address = address
+        #fragments are decompressed by sink, codec is only reported
+        self.codec = codec
+        #resumed file continues after offset, saved sink completes file when all fragments are written
+        self.offset = offset
+        self.saved = saved
+        self.received_set = ReorderBuffer(window_size)
+        self.fec = fec.FecDecoder(fec_group, last_fragment_number) if fec_group else None
+        #next fragment to save
+        self.rn = 0
+        self.min_rn_req = -1
+        self.timeout = 0
+        #fragments saved in order are acknowledged together, when ack_every of them arrive or after ack_delay,
+        #at most half of window is left unacknowledged, so sender isn't stopped by full window
+        self.ack_every = max(1, min(connection.settings['ack_every'], window_size // 2))
+        self.unacknowledged = 0
+        self.ack_timer = None
+        self.start_time = time.monotonic()
+        self.metrics = Metrics()
+        self.counters = self.metrics.counters
+
+    def done(self):
+        return self.rn > self.last_fragment_number
+
+    #live metrics of running transfer
+    def stats(self):
+        stats = {'stream': self.stream, 'direction': 'received', 'fragments': self.last_fragment_number + 1,
+                 'delivered': self.rn, 'seconds': time.monotonic() - self.start_time}
+        stats.update(self.metrics.snapshot())
+        return stats
+
+    #with FEC loss rate is reported to sender in window
+    def reply(self, flags, frag_num, data):
+        ack_flag = fragment_replies[self.flag][0]
+        if flags == ack_flag:
+            self.cancel_ack()
+        #request doesn't move window of sender, delayed acknowledgement is sent before it,
+        #holes are reported only by request
+        elif self.ack_timer is not None:
+            self.reply(ack_flag, self.rn - 1, b'')
+        self.counters['acks_sent' if flags == ack_flag else 'reqs_sent'] += 1
+        loss = round(self.fec.loss * fec.LOSS_SCALE) if self.fec is not None else 0
+        self.connection.send(self.connection.encode(flags, frag_num, loss, data, self.stream))
+
+    def on_fragment(self, msg, correct):
+        ack_flag, req_flag = fragment_replies[self.flag]
+        frag_num = msg['fragment_number']
+        counters = self.counters
+        if frag_num > self.last_fragment_number and self.fec is not None:
+            self.on_parity(msg, correct)
+            return
+        counters['fragments_received'] += 1
+        counters['fragment_bytes_received'] += msg['size']
+        #fragment is already saved, sender retransmits it when acknowledgement was lost, so it is acknowledged again
+        if frag_num < self.rn:
+            counters['fragments_duplicated'] += 1
+            if correct:
+                self.reply(ack_flag, self.rn - 1, self.received_set.sack_bitmap())
+            return
+        if self.fec is not None:
+            self.fec.arrived(frag_num)
+        #fragment corrupted, with FEC it is requested only when its group can't be rebuilt
+        if not correct:
+            counters['fragments_corrupted'] += 1
+            if self.fec is not None and self.fec.pending(frag_num):
+                self.logger.debug('fragment', "received corrupt fragment\t<-{}:{}✘", self.stream, frag_num)
+                return
+            self.reply(req_flag, frag_num, b'')
+            self.logger.debug('fragment', "received corrupt fragment\t<-{0}:{1}✘\nsent fragment REQ\t\t\t->{0}:{1}",
+                              self.stream, frag_num)
+            return
+        received_set = self.received_set
+        #fragment after gap creates new hole
+        new_hole = frag_num > max(received_set.highest, self.rn - 1) + 1
+        if not received_set.add(frag_num, msg['data']):
+            #fragment beyond window is dropped, sender sends it again
+            if not received_set.in_window(frag_num):
+                counters['fragments_out_of_window'] += 1
+                self.logger.debug('fragment', "received fragment\t\t\t<-{}:{} out of window", self.stream, frag_num)
+                return
+            counters['fragments_duplicated'] += 1
+        else:
+            if frag_num > self.rn:
+                counters['fragments_out_of_order'] += 1
+            if self.fec is not None:
+                self.add_rebuilt(self.fec.add_data(frag_num, msg['data']))
+        self.advance(frag_num, new_hole)
+
+    #parity of group, rebuilt fragments are stored like received ones
+    def on_parity(self, msg, correct):
+        self.counters['fragment_bytes_received'] += msg['size']
+        if not correct:
+            self.counters['fec_parities_corrupted'] += 1
+            return
+        self.counters['fec_parities_received'] += 1
+        self.add_rebuilt(self.fec.add_parity(msg['fragment_number'], msg['data']))
+        if self.rn <= self.last_fragment_number:
+            self.advance(msg['fragment_number'], False)
+
+    def add_rebuilt(self, rebuilt):
+        for frag_num, data in rebuilt:
+            if frag_num >= self.rn and self.received_set.add(frag_num, data):
+                self.counters['fec_recovered'] += 1
+                self.logger.debug('fragment', "rebuilt fragment\t\t\t{}:{}", self.stream, frag_num)
+
+    #every fragment saved so far is acknowledged,
+    #fragments stored after next hole are selectively acknowledged
+    def acknowledge(self):
+        self.reply(fragment_replies[self.flag][0], self.rn - 1, self.received_set.sack_bitmap())
+
+    def cancel_ack(self):
+        self.unacknowledged = 0
+        if self.ack_timer is not None:
+            self.ack_timer.cancel()
+            self.ack_timer = None
+
+    #fragments in order are saved and acknowledged, hole is requested
+    def advance(self, frag_num, new_hole):
+        ack_flag, req_flag = fragment_replies[self.flag]
+        received_set = self.received_set
+        #if next fragment is in set start saving and send ack
+        if self.rn in received_set:
+            previous = self.rn
+            #malformed delta or error of file stops the transfer
+            try:
+                for fragment in received_set.pop_ready():
+                    self.sink.write(fragment)
+            except (OSError, ValueError) as error:
+                self.connection.abort_incoming(self, str(error))
+                return
+            self.rn = received_set.next
+            if self.fec is not None:
+                self.fec.discard(self.rn)
+            self.unacknowledged += self.rn - previous
+            #filled hole, fragments after next hole and the end of transfer are acknowledged at once
+            if self.unacknowledged >= self.ack_every or self.rn - previous > 1 or received_set.count or self.done():
+                self.acknowledge()
+                self.logger.debug('fragment', "received fragment\t\t\t<-{0}:{1}✔\nsent fragment ACK\t\t\t->{0}:{2}",
+                                  self.stream, frag_num, self.rn - 1)
+            else:
+                self.counters['acks_delayed'] += 1
+                if self.ack_timer is None:
+                    self.ack_timer = self.connection.engine.loop.call_later(
+                        self.connection.settings['ack_delay'] / 1000, self.acknowledge)
+                self.logger.debug('fragment', "received fragment\t\t\t<-{}:{}✔", self.stream, frag_num)
+        #group of hole waits for parities, fragments after hole are selectively acknowledged,
+        #so sender continues to the end of group
+        elif self.fec is not None and self.fec.pending(self.rn):
+            if self.rn:
+                self.reply(ack_flag, self.rn - 1, received_set.sack_bitmap())
+            self.logger.debug('fragment', "received fragment\t\t\t<-{}:{}✔", self.stream, frag_num)
+        #if out of order send request with received fragments, if it wasn't send or new hole appeared,
+        #after 15 other messages received resend
+        elif new_hole or self.min_rn_req < self.rn or self.timeout > REQUEST_INTERVAL:
+            self.reply(req_flag, self.rn, received_set.sack_bitmap())
+            self.logger.debug('fragment', "received fragment\t\t\t<-{0}:{1}✔\nsent fragment REQ\t\t\t->{0}:{2}",
+                              self.stream, frag_num, self.rn)
+            self.min_rn_req = self.rn
+            self.timeout = 0
+        else:
+            self.logger.debug('fragment', "received fragment\t\t\t<-{}:{}✔", self.stream, frag_num)
+            self.timeout += 1
+
+
+########################################################################################################################
+#datagrams of socket are passed to engine
+class EngineProtocol(asyncio.DatagramProtocol):
+    def __init__(self, engine):
+        self.engine = engine
+
+    def datagram_received(self, data, addr):
+        self.engine.datagram_received(data, addr)
+
+    #unreachable peer is detected by timeouts
+    def error_received(self, exc):
+        pass
+
+
+#connection with one peer, handshakes, transfers and keepalives are coroutines in event loop of engine,
+#transfers run concurrently, each in its own stream, if peer supports streams
+class Connection:
+    def __init__(self, engine, address):
+        self.engine = engine
+        self.address = address
+        self.logger = engine.logger
+        #metrics of this peer and totals of its transfers, engine has totals of all peers
+        self.metrics = Metrics(engine.metrics)
+        self.last_transfer = None
+        self.connected = False
+        #number of running operations started by this side
+        self.busy = 0
+        #checksum and features used after handshake
+        self.checksum_type = checksum.DEFAULT_CHECKSUM
+        self.features = set()
+        #timeouts are derived from RTT estimation of connection
+        self.rtt = RttEstimator()
+        self.last_msg = time.monotonic()
+        #(flag of expected reply, stream) -> (future of exchange, result)
+        self.waiting = {}
+        #stream -> transfer
+        self.outgoing = {}
+        self.incoming = {}
+        #stream -> (flag, last fragment number) of received transfers,
+        #their fragments are acknowledged again if the last acknowledgement was lost
+        self.completed = collections.OrderedDict()
+        #streams of peer, whose parameters were rejected, their late fast start fragments aren't kept
+        self.rejected = collections.OrderedDict()
+        #streams used by sending of this side and next stream to try
+        self.open_streams = set()
+        self.next_stream = 1
+        #stream of sent file -> future of signatures of peer's copy
+        self.signature_requests = {}
+        #stream of received signatures -> stream of sent file
+        self.signature_streams = {}
+        #streams of peer's files, whose signatures are being sent
+        self.signature_replies = set()
+        #loss rate reported by receiver of the last transfer with FEC, auto FEC of next transfer starts with it
+        self.fec_loss = 0.0
+        #without streams transfers are sent one after another, lock is created in event loop
+        self.serial = None
+        self.scheduler = None
+        #running keepalive exchange started by watchdog of engine
+        self.keepalive = None
+        #fragment size of path to peer, discovered by probes after handshake
+        self.path_fragment_size = MAX_FRAGMENT_SIZE
+        self.discovery = None
+        #HS2 was sent, connection waits for HS3
+        self.accepted = False
+        #stream -> fast start fragments received before parameters and their total size
+        self.early = {}
+        self.early_size = 0
+
+    @property
+    def settings(self):
+        return self.engine.settings
+
+    @property
+    def gso_enabled(self):
+        return self.engine.gso_enabled
+
+    #first window of transfer is sent without waiting for acknowledgement of parameters
+    @property
+    def fast_start(self):
+        return 'faststart' in self.features and self.settings['fast_start'] == 'on'
+
+    #fragment size of next transfer, 0 in settings means size discovered for path
+    @property
+    def fragment_size(self):
+        return self.settings['max_fragment_size'] or self.path_fragment_size
+
+    #something is sent or received
+    @property
+    def sending(self):
+        return self.busy > 0 or bool(self.incoming)
+
+    def count(self, name, value=1):
+        self.metrics.count(name, value)
+
+    #with several peers, output is marked with address of peer
+    def output(self, text):
+        if self.engine.max_peers > 1:
+            text = f"{self.address[0]}:{self.address[1]} {text}"
+        self.engine.output(text)
+
+    def update_status(self):
+        self.engine.update_status()
+
+    def encode(self, flags, frag_num, window_size, data, stream=0):
+        return encode_message(flags, frag_num, window_size, data, self.checksum_type,
+                              self.settings['corruption_rate'], stream if 'streams' in self.features else None)
+
+    def send(self, encoded):
+        self.count('datagrams_sent')
+        self.count('bytes_sent', len(encoded))
+        self.engine.send(encoded, self.address)
+
+    def send_batch(self, batch, size):
+        self.count('datagrams_sent', len(batch))
+        self.count('bytes_sent', size)
+        self.engine.send_batch(batch, self.address)
+
+    #frame is sent until reply arrives, request of peer sends it again at once, but it uses one of tries,
+    #so peer requesting every try doesn't keep exchange running, returns True when acknowledged
+    async def exchange(self, name, flags, frag_num, window_size, data, ack_flag, req_flag=None, tries=TRIES, stream=0):
+        return await self.request(name, flags, frag_num, window_size, data, ack_flag, req_flag, tries, stream) is not None
+
+    #exchange returning acknowledgement or rejection, None when peer didn't answer any try
+    async def request(self, name, flags, frag_num, window_size, data, ack_flag, req_flag=None, tries=TRIES, stream=0,
+                      reject_flag=None):
+        retry = False
+        while tries > 0:
+            reply = self.engine.loop.create_future()
+            self.waiting[(ack_flag, stream)] = (reply, True)
+            if req_flag is not None:
+                self.waiting[(req_flag, stream)] = (reply, False)
+            if reject_flag is not None:
+                self.waiting[(reject_flag, stream)] = (reply, True)
+            self.rtt.start((name, stream), retry)
+            self.send(self.encode(flags, frag_num, window_size, data, stream))
+            self.logger.debug('exchange', "sent {}", name)
+            try:
+                acknowledged = await asyncio.wait_for(reply, self.rtt.timeout())
+            except asyncio.TimeoutError:
+                tries -= 1
+                retry = True
+                self.rtt.on_timeout()
+                if tries:
+                    self.logger.warning('exchange', "\nUnable to reach, remaining tries: {}\n", tries)
+                continue
+            finally:
+                self.waiting.pop((ack_flag, stream), None)
+                self.waiting.pop((req_flag, stream), None)
+                self.waiting.pop((reject_flag, stream), None)
+            if acknowledged is not None:
+                self.sample_rtt(self.rtt.finish((name, stream)))
+                return acknowledged
+            tries -= 1
+            retry = True
+        return None
+
+    #RTT of acknowledged exchange, None when message was sent again
+    def sample_rtt(self, rtt):
+        if rtt is not None:
+            self.metrics.observe('rtt', rtt)
+
+    ####################################################################################################################
+    #connection initialization
+    async def connect(self):
+        if self.connected or not self.engine.configured:
+            return self.connected
+        self.busy += 1
+        #new connection starts with new RTT estimation
+        self.rtt.reset()
+        #offered checksums and features are sent in HS1
+        offer = ",".join(checksum.checksum_offer(self.settings['checksum']) + list(FEATURES))
+        connected = await self.exchange('HS1', flags_types['FLAG_HS1'], 0, 0, offer, flags_types['FLAG_HS2'])
+        self.busy -= 1
+        if connected:
+            self.output("Connected")
+            self.logger.info('connection', "\nConnected\n")
+            self.update_status()
+            return True
+        self.logger.warning('connection', "\nUnable to reach\n")
+        self.output("Unable to reach")
+        self.update_status()
+        return False
+
+    def on_connected(self):
+        self.connected = True
+        self.accepted = False
+        self.last_msg = time.monotonic()
+        #streams of previous connection are forgotten
+        self.close_incoming()
+        self.completed.clear()
+        self.rejected.clear()
+        #path is probed again, it may have changed since previous connection
+        self.stop_discovery()
+        self.path_fragment_size = MAX_FRAGMENT_SIZE
+        if self.settings['max_fragment_size'] == 0 and self.engine.dont_fragment and 'pmtu' in self.features:
+            self.discovery = self.engine.loop.create_task(self.discover_path())
+        self.update_status()
+
+    #connection ended, running transfers are stopped
+    def on_disconnected(self):
+        self.connected = False
+        self.stop_discovery()
+        if self.scheduler:
+            self.scheduler.wake()
+        self.close_incoming()
+        self.logger.info('connection', "\nDisconnected\n")
+        self.engine.on_disconnected(self)
+        self.update_status()
+
+    #disconnection initialization
+    async def disconnect(self):
+        if not self.connected:
+            return
+        self.busy += 1
+        self.update_status()
+        exited = await self.exchange('EXIT', flags_types['FLAG_EXIT'], 0, 0, "", flags_types['FLAG_EXIT_ACK'])
+        self.busy -= 1
+        if not exited:
+            #if no remaining tries, peer not reached, disconnected
+            self.logger.warning('connection', "\nPeer not reached\n")
+            self.output("Peer not reached")
+        if self.connected:
+            self.on_disconnected()
+        else:
+            self.update_status()
+
+    #time without any message after which peer is checked,
+    #idle time or inactivity timeout during transfer
+    def idle_limit(self):
+        return inactivity_timeout(self.rtt) if self.sending else KEEPALIVE_INTERVAL
+
+    #peer is checked with keepalive, peer which doesn't answer is disconnected
+    async def keep_alive(self):
+        try:
+            if self.sending:
+                self.logger.info('keepalive', "\nInactivity detected, sending keep-alive.\n")
+            self.count('keepalives_sent')
+            if not await self.exchange('KEEPALIVE', flags_types['FLAG_KEEPALIVE'], 0, 0, "",
+                                       flags_types['FLAG_KEEPALIVE_ACK']):
+                self.logger.warning('connection', "\nPeer not reached\n")
+                self.output("Peer disconnected")
+                if self.connected:
+                    self.on_disconnected()
+        finally:
+            self.keepalive = None
+
+    #the largest probe acknowledged by peer, probing starts with Ethernet and continues up to larger MTUs
+    #until probe is lost, or down to smaller ones until probe is acknowledged,
+    #without acknowledged probe default fragment size is kept
+    async def discover_path(self):
+        try:
+            size = None
+            if await self.probe(pmtu.START_SIZE):
+                size = pmtu.START_SIZE
+                for larger in [s for s in pmtu.SIZES if s > pmtu.START_SIZE]:
+                    if not await self.probe(larger):
+                        break
+                    size = larger
+            else:
+                for smaller in sorted([s for s in pmtu.SIZES if s < pmtu.START_SIZE], reverse=True):
+                    if await self.probe(smaller):
+                        size = smaller
+                        break
+            if size is None:
+                self.logger.warning('connection', "\nPath MTU not discovered, fragment size: {}\n",
+                                    self.path_fragment_size)
+                return
+            self.path_fragment_size = fragment_size_for(size)
+            self.logger.info('connection', "\nPath datagram size: {}B\nFragment size: {}\n", size,
+                             self.path_fragment_size)
+        finally:
+            self.discovery = None
+
+    #probe is datagram of given size padded with zeros, peer acknowledges it with its size,
+    #lost probe doesn't back off retransmission timeout, it is expected on path with smaller MTU
+    async def probe(self, size):
+        flag = flags_types['FLAG_PROBE']
+        header_size = struct.calcsize(header_format_for(flag, self.checksum_type, 'streams' in self.features))
+        encoded = self.encode(flag, size, 0, bytes(size - header_size))
+        for _ in range(pmtu.PROBE_TRIES):
+            reply = self.engine.loop.create_future()
+            self.waiting[(flags_types['FLAG_PROBE_ACK'], 0)] = (reply, True)
+            self.count('probes_sent')
+            self.send(encoded)
+            try:
+                acknowledgement = await asyncio.wait_for(reply, self.rtt.timeout())
+            except asyncio.TimeoutError:
+                continue
+            finally:
+                self.waiting.pop((flags_types['FLAG_PROBE_ACK'], 0), None)
+            if acknowledgement['fragment_number'] == size:
+                return True
+        return False
+
+    #transfers started right after handshake wait for discovery, fragment size of transfer can't change,
+    #content sent in the first congestion window of current fragment size doesn't wait
+    async def path_discovered(self, size):
+        if self.discovery and size > congestion.INITIAL_WINDOW * self.fragment_size:
+            await asyncio.wait([self.discovery])
+
+    def stop_discovery(self):
+        if self.discovery:
+            self.discovery.cancel()
+            self.discovery = None
+
+    #running tasks of connection are stopped when engine is closed
+    def close(self):
+        self.connected = False
+        self.stop_discovery()
+        if self.keepalive:
+            self.keepalive.cancel()
+        if self.scheduler:
+            self.scheduler.wake()
+        self.close_incoming()
+
+    ####################################################################################################################
+    #send message
+    async def send_text(self, text):
+        if not self.connected or not text:
+            return False
+        self.busy += 1
+        self.update_status()
+        stream = await self.open_stream()
+        try:
+            message = text.encode('utf-8')
+            await self.path_discovered(len(message))
+            fragment_size = self.fragment_size
+            #sending not fragmented text, size is in bytes not characters
+            if len(message) <= fragment_size:
+                delivered = await self.exchange('MSG', flags_types['FLAG_MSG'], 0, 0, message,
+                                                flags_types['FLAG_MSG_ACK'], flags_types['FLAG_MSG_REQ'],
+                                                stream=stream)
+                if delivered:
+                    self.logger.info('transfer', "\nSent msg:{}", text)
+                elif self.connected:
+                    self.output("Message not delivered")
+            #sending fragmented text, character can be split between fragments
+            else:
+                delivered = await self.send_text_fragments(stream, message, fragment_size)
+                #receiver which can't decompress text gets it uncompressed in new stream
+                if delivered is None:
+                    stream = await self.reopen_stream(stream)
+                    delivered = await self.send_text_fragments(stream, message, fragment_size, compressed=False)
+        finally:
+            self.close_stream(stream)
+        return self.finish_sending(delivered, f"You: {text}")
+
+    #parameters and fragments of text, returns True when delivered, None when receiver rejected parameters
+    async def send_text_fragments(self, stream, message, fragment_size, compressed=True):
+        codec, content = await self.compress_content(message) if compressed else (None, message)
+        last_fragment = len(content) // fragment_size
+        window_size = self.transfer_window(last_fragment)
+        fec_setting = self.fec_setting(last_fragment)
+        self.logger.info('transfer', "\nsent MSG PAR:\nStream: {}\nLast fragment number: {}\n"
+                         "Number of fragments: {}\nMax window size: {}\nSize of text: {}\nFragment size: {}\n"
+                         "Compression: {}\nFEC: {}\n", stream, last_fragment, last_fragment + 1, window_size,
+                         len(message), fragment_size, codec or 'none', self.settings['fec'] if fec_setting else 'off')
+        parameters = self.send_parameters('MSG_PAR', flags_types['FLAG_MSG_PAR'], last_fragment, window_size,
+                                          parameters_data('', codec, fec_group=fec_setting and fec_setting[0]), stream)
+        acknowledged, delivered = await self.send_transfer(parameters, stream, flags_types['FLAG_MSG_FRAG'], content,
+                                                           fragment_size, last_fragment, window_size, len(message),
+                                                           codec, fec_setting=fec_setting)
+        if acknowledged is False and self.connected:
+            self.output("Parameters not delivered")
+        if delivered:
+            self.logger.info('transfer', "\nMessage delivered\n")
+        return None if acknowledged is None else delivered
+
+    #send file
+    async def send_file(self, file_path):
+        if not self.connected or not os.path.isfile(file_path):
+            return False
+        self.busy += 1
+        self.update_status()
+        stream = await self.open_stream()
+        delivered = False
+        try:
+            #receiver with checkpoint of the same file continues after its saved prefix
+            identity = checkpoint.file_identity(file_path) if 'resume' in self.features else ''
+            point = (0, '')
+            #checkpoint is saved after full block, smaller file is sent without asking for it
+            if identity and os.path.getsize(file_path) >= checkpoint.BLOCK_SIZE:
+                point = await self.resume_point(stream, file_path, identity)
+            #file which isn't resumed is sent as differences from copy of receiver
+            signatures = b''
+            if point == (0, '') and 'delta' in self.features and self.settings['delta_sync'] == 'on' and \
+                    os.path.getsize(file_path) >= delta.MIN_SIZE:
+                signatures = await self.fetch_signatures(stream, file_path)
+            if point is None or signatures is None:
+                if self.connected:
+                    self.output("Data not delivered")
+            else:
+                delivered = await self.send_file_content(stream, file_path, identity, *point, signatures)
+                #receiver which can't continue its checkpoint or decompress file gets whole file uncompressed
+                #in new stream
+                if delivered is None:
+                    stream = await self.reopen_stream(stream)
+                    delivered = await self.send_file_content(stream, file_path, identity, compressed=False)
+        finally:
+            self.close_stream(stream)
+        return self.finish_sending(delivered, f"You: send file-> {file_path}")
+
+    #parameters and fragments of file after offset or of its differences from signatures of copy of receiver,
+    #returns True when delivered, None when receiver rejected parameters
+    async def send_file_content(self, stream, file_path, identity, offset=0, resume='', signatures=b'',
+                                compressed=True):
+        content = changes = data = b''
+        try:
+            #file is read while sending, delta and compressed content are prepared before parameters,
+            #they carry its size
+            content = open_file_content(file_path, offset)
+            changes, description = content, ''
+            if signatures:
+                changes, description, stats = await self.engine.loop.run_in_executor(None, delta.encode_delta,
+                                                                                     content, signatures)
+                self.count('delta_bytes_copied', stats['copied'])
+                self.count('delta_bytes_literal', stats['literal'])
+                self.logger.info('transfer', "\nDelta of {}: copied {}B, literal {}B\n", file_path, stats['copied'],
+                                 stats['literal'])
+            codec, data = await self.compress_content(changes) if compressed else (None, changes)
+            await self.path_discovered(len(data))
+            fragment_size = self.fragment_size
+            last_fragment = len(data) // fragment_size
+            window_size = self.transfer_window(last_fragment)
+            fec_setting = self.fec_setting(last_fragment)
+            self.logger.info('transfer', "\nsent DATA PAR:\nStream: {}\nLast fragment number: {}\n"
+                             "Number of fragments: {}\nMax window size: {}\nSize of file: {}B\nFragment size: {}\n"
+                             "Compression: {}\nSize sent: {}B\nResumed from: {}B\nFEC: {}\nFile path: {}\n", stream,
+                             last_fragment, last_fragment + 1, window_size, len(content), fragment_size,
+                             codec or 'none', len(data), offset, self.settings['fec'] if fec_setting else 'off',
+                             file_path)
+            parameters = self.send_parameters('DATA_PAR', flags_types['FLAG_DATA_PAR'], last_fragment, window_size,
+                                              parameters_data(os.path.basename(file_path), codec, identity, resume,
+                                                              description, fec_setting and fec_setting[0]), stream)
+            acknowledged, delivered = await self.send_transfer(parameters, stream, flags_types['FLAG_DATA'], data,
+                                                               fragment_size, last_fragment, window_size,
+                                                               len(content), codec, offset, fec_setting)
+            if acknowledged is False and self.connected:
+                self.output("Data not delivered")
+            if delivered:
+                self.logger.info('transfer', "\nFile delivered\n")
+        finally:
+            for mapped in (content, changes, data):
+                if isinstance(mapped, mmap.mmap):
+                    mapped.close()
+        return None if acknowledged is None else delivered
+
+    #receiver is asked for checkpoint of file, its prefix is resumed only when digest of the same prefix
+    #of sent file matches, returns (offset, resume field of parameters), None when receiver didn't answer
+    async def resume_point(self, stream, file_path, identity):
+        reply = await self.request('DATA_PAR', flags_types['FLAG_DATA_PAR'], 0, 0,
+                                   parameters_data(os.path.basename(file_path), None, identity, checkpoint.PROBE),
+                                   flags_types['FLAG_DATA_PAR_ACK'], flags_types['FLAG_DATA_PAR_REQ'], stream=stream)
+        if reply is None:
+            return None
+        offset, digest = checkpoint.parse_point(reply['data'].decode('utf-8', 'replace'))
+        if offset <= 0 or offset % checkpoint.BLOCK_SIZE or offset > os.path.getsize(file_path):
+            return 0, ''
+        #prefix is hashed in thread, it may be large
+        if await self.engine.loop.run_in_executor(None, checkpoint.prefix_digest, file_path, offset) != digest:
+            self.logger.warning('transfer', "\nCheckpoint of peer doesn't match {}, sending whole file\n", file_path)
+            return 0, ''
+        self.logger.info('transfer', "\nResuming {} from {}B\n", file_path, offset)
+        return offset, checkpoint.format_point(offset, digest)
+
+    #receiver with copy of file sends its signatures in its own transfer,
+    #returns signatures, empty without copy, None when receiver didn't answer
+    async def fetch_signatures(self, stream, file_path):
+        reply = self.signature_requests[stream] = self.engine.loop.create_future()
+        try:
+            acknowledgement = await self.request('DATA_PAR', flags_types['FLAG_DATA_PAR'], 0, 0,
+                                                 parameters_data(os.path.basename(file_path), None, changes=delta.PROBE),
+                                                 flags_types['FLAG_DATA_PAR_ACK'], flags_types['FLAG_DATA_PAR_REQ'],
+                                                 stream=stream)
+            if acknowledgement is None:
+                return None
+            if acknowledgement['data'].decode('utf-8', 'replace') != delta.SIGNATURES:
+                return b''
+            #future is cancelled with None when connection is closed
+            signatures = await reply
+            #copy was removed before its signatures were computed, file is sent whole
+            if signatures is not None and len(signatures) <= delta.SIGNATURE_HEADER.size:
+                return b''
+            return signatures
+        finally:
+            self.signature_requests.pop(stream, None)
+
+    #signatures of copy of file asked by peer are sent in transfer of this side, reference is stream of peer,
+    #returns acknowledgement of probe
+    def offer_signatures(self, name, reference):
+        try:
+            address = download_path(self.settings['download_address'], name)
+        except ValueError:
+            return ''
+        if not os.path.isfile(address) or not os.path.getsize(address) or self.engine.receiving(address):
+            return ''
+        #probe sent again, because acknowledgement was lost
+        if reference not in self.signature_replies:
+            self.signature_replies.add(reference)
+            self.engine.loop.create_task(self.send_signatures(address, name, reference))
+        return delta.SIGNATURES
+
+    async def send_signatures(self, address, name, reference):
+        self.busy += 1
+        self.update_status()
+        stream = await self.open_stream()
+        delivered = False
+        try:
+            try:
+                signatures = await self.engine.loop.run_in_executor(None, delta.file_signatures, address)
+            #copy was removed, signatures without blocks make sender send the whole file
+            except OSError:
+                signatures = delta.SIGNATURE_HEADER.pack(delta.MIN_BLOCK, 0)
+            await self.path_discovered(len(signatures))
+            fragment_size = self.fragment_size
+            last_fragment = len(signatures) // fragment_size
+            window_size = self.transfer_window(last_fragment)
+            self.logger.info('transfer', "\nsent signatures of {}:\nStream: {}\nSize: {}B\n", address, stream,
+                             len(signatures))
+            parameters = self.send_parameters('DATA_PAR', flags_types['FLAG_DATA_PAR'], last_fragment, window_size,
+                                              parameters_data(name, None, changes=delta.format_reference(reference)),
+                                              stream)
+            _, delivered = await self.send_transfer(parameters, stream, flags_types['FLAG_DATA'], signatures,
+                                                    fragment_size, last_fragment, window_size)
+        finally:
+            self.close_stream(stream)
+            self.signature_replies.discard(reference)
+        self.busy -= 1
+        if not delivered and self.connected:
+            self.logger.warning('connection', "\nPeer not reached\n")
+            self.on_disconnected()
+        else:
+            self.update_status()
+
+    #content is compressed with codec supported by both peers, unless it is too large or its samples don't shrink,
+    #compression runs in thread, so other transfers of engine aren't stopped
+    async def compress_content(self, content):
+        codec = compress.choose_codec(self.settings['compression'], self.features)
+        if codec is None or not compress.worth_compressing(content):
+            return None, content
+        return codec, await self.engine.loop.run_in_executor(None, compress.compress_content, codec, content)
+
+    #window advertised in parameters, with fast start small transfer is sent in the first congestion window at once
+    def transfer_window(self, last_fragment):
+        window = advertised_window(last_fragment, self.settings['window_size'])
+        if self.fast_start:
+            window = max(window, min(congestion.INITIAL_WINDOW, last_fragment + 1,
+                                     self.settings['window_size'] or MAX_WINDOW))
+        return window
+
+    #FEC of transfer, None when it is off or peer can't rebuild fragments,
+    #numbers of parities of the last groups have to fit into fragment number
+    def fec_setting(self, last_fragment):
+        setting = fec.parse_setting(self.settings['fec'])
+        if setting is None or 'fec' not in self.features or \
+                fec.parity_number(last_fragment, last_fragment // setting[0], fec.MAX_PARITY) > 0xffffffff:
+            return None
+        return setting
+
+    #stream of new transfer, peer without streams receives transfers one after another in stream 0
+    async def open_stream(self):
+        if 'streams' not in self.features:
+            if self.serial is None:
+                self.serial = asyncio.Lock()
+            await self.serial.acquire()
+            return 0
+        while self.next_stream in self.open_streams:
+            self.next_stream = self.next_stream % MAX_STREAM + 1
+        stream = self.next_stream
+        self.next_stream = self.next_stream % MAX_STREAM + 1
+        self.open_streams.add(stream)
+        return stream
+
+    def close_stream(self, stream):
+        if stream:
+            self.open_streams.discard(stream)
+        else:
+            self.serial.release()
+
+    #rejected transfer is sent again in new stream, late fragments of rejected one may still arrive to its stream
+    async def reopen_stream(self, stream):
+        self.close_stream(stream)
+        return await self.open_stream()
+
+    #parameters of transfer, returns True when acknowledged, False when receiver didn't answer,
+    #None when it rejected them
+    async def send_parameters(self, name, flags, last_fragment, window_size, data, stream):
+        ack_flag, req_flag, reject_flag = parameter_replies[flags]
+        reply = await self.request(name, flags, last_fragment, window_size, data, ack_flag, req_flag, stream=stream,
+                                   reject_flag=reject_flag)
+        if reply is None:
+            return False
+        if reply['flags'] == reject_flag:
+            self.logger.warning('transfer', "\nParameters of stream {} rejected by peer: {}\n", stream,
+                                reply['data'].decode('utf-8', 'replace'))
+            return None
+        return True
+
+    #parameters exchange is followed by fragments, returns (parameters acknowledged, transfer delivered),
+    #acknowledged is None when receiver rejected parameters,
+    #with fast start the first window of fragments is sent right after parameters without waiting for their
+    #acknowledgement, receiver keeps fragments until parameters arrive, transfer stops if they aren't acknowledged
+    async def send_transfer(self, parameters, stream, flag, content, fragment_size, last_fragment_number, window_size,
+                            size=None, codec=None, offset=0, fec_setting=None):
+        if not self.fast_start:
+            acknowledged = await parameters
+            if not acknowledged:
+                return acknowledged, False
+            return True, await self.send_fragments(stream, flag, content, fragment_size, last_fragment_number,
+                                                   window_size, size, codec, offset, fec_setting)
+        parameters = self.engine.loop.create_task(parameters)
+        try:
+            delivered = await self.send_fragments(stream, flag, content, fragment_size, last_fragment_number,
+                                                  window_size, size, codec, offset, fec_setting, parameters)
+        finally:
+            #delivered fragments acknowledge parameters too
+            parameters.cancel()
+        return delivered or not parameters.done() or parameters.cancelled() or parameters.result(), delivered
+
+    #fragments are sent by scheduler of connection together with fragments of other streams
+    #size and codec of content before compression and offset of resumed file are reported in summary,
+    #transfer of fast start stops when exchange of its parameters fails
+    async def send_fragments(self, stream, flag, content, fragment_size, last_fragment_number, window_size, size=None,
+                             codec=None, offset=0, fec_setting=None, parameters=None):
+        transfer = OutgoingTransfer(self, stream, flag, content, fragment_size, last_fragment_number, window_size,
+                                    fec_setting)
+        self.outgoing[stream] = transfer
+        if self.scheduler is None:
+            self.scheduler = Scheduler(self)
+            self.engine.loop.create_task(self.run_scheduler())
+        else:
+            self.scheduler.wake()
+        try:
+            if parameters is not None:
+                await asyncio.wait([parameters, transfer.done], return_when=asyncio.FIRST_COMPLETED)
+                if parameters.done() and not parameters.result():
+                    transfer.finish(False)
+            delivered = await transfer.done
+        finally:
+            transfer.finish(False)
+        if delivered:
+            self.count('transfers_sent')
+            size = len(content) if size is None else size
+            self.count('payload_bytes_sent', size)
+            if offset:
+                self.count('transfers_resumed')
+            self.on_transfer(transfer_stats('sent', size, last_fragment_number, time.monotonic() - transfer.start_time,
+                                            transfer.metrics, codec, offset))
+        return delivered
+
+    #summary of finished transfer is kept also by engine, connection is forgotten after disconnection
+    def on_transfer(self, stats):
+        stats['peer'] = self.address
+        self.last_transfer = stats
+        self.engine.last_transfer = stats
+        self.engine.transfers.append(stats)
+
+    #scheduler runs while some stream sends, next transfer starts with new congestion window
+    async def run_scheduler(self):
+        try:
+            await self.scheduler.run()
+        finally:
+            self.scheduler = None
+            for transfer in list(self.outgoing.values()):
+                transfer.finish(False)
+
+    #peer which didn't answer any try is disconnected, peer which rejected transfer stays connected
+    def finish_sending(self, delivered, text):
+        self.busy -= 1
+        if delivered:
+            self.output(text)
+            self.update_status()
+        elif delivered is None:
+            self.output("Transfer rejected by peer")
+            self.update_status()
+        elif self.connected:
+            self.output("Peer not reached")
+            self.on_disconnected()
+        else:
+            self.update_status()
+        return delivered
+
+    #metrics of connection with state of RTT estimation and congestion window and of running transfers
+    def stats(self):
+        stats = self.metrics.snapshot(self.running_metrics())
+        stats.update(connected=self.connected, peer=self.address, checksum=self.checksum_type,
+                     features=sorted(self.features), srtt=self.rtt.srtt, rto=self.rtt.timeout(),
+                     fragment_size=self.fragment_size,
+                     streams=len(self.outgoing) + len(self.incoming), last_transfer=self.last_transfer,
+                     transfers=[transfer.stats() for transfer in
+                                list(self.outgoing.values()) + list(self.incoming.values())])
+        if self.scheduler:
+            stats['cwnd'] = self.scheduler.controller.window()
+        return stats
+
+    ####################################################################################################################
+    #receive
+    def close_incoming(self):
+        for incoming in self.incoming.values():
+            incoming.cancel_ack()
+            incoming.sink.close()
+            self.metrics.merge(incoming.metrics)
+        self.incoming = {}
+        self.early = {}
+        self.early_size = 0
+        self.signature_streams = {}
+        for reply in self.signature_requests.values():
+            if not reply.done():
+                reply.set_result(None)
+
+    #metrics of transfers, which are still running
+    def running_metrics(self):
+        return [transfer.metrics for transfer in list(self.outgoing.values()) + list(self.incoming.values())]
+
+    def datagram_received(self, data):
+        try:
+            msg = decode_message(data, self.checksum_type, 'streams' in self.features)
+        #message shorter than header
+        except struct.error:
+            return
+        flags = msg['flags']
+        stream = msg['stream']
+        self.last_msg = time.monotonic()
+        self.count('datagrams_received')
+        self.count('bytes_received', len(data))
+        #checksum is computed once per received message
+        correct = msg['checksum'] == checksum.get_checksum(msg['data'], msg['checksum_type'])
+        if not correct:
+            self.count('corrupted_received')
+        #reply of running exchange
+        if (flags, stream) in self.waiting and correct:
+            reply, result = self.waiting[(flags, stream)]
+            if not reply.done():
+                reply.set_result(msg if result else None)
+        if flags in handshake_flags:
+            if correct:
+                self.on_handshake(msg)
+            return
+        #probe of path MTU is acknowledged with size of received datagram, it may arrive before HS3
+        if flags == flags_types['FLAG_PROBE']:
+            if correct:
+                self.send(self.encode(flags_types['FLAG_PROBE_ACK'], msg['size'], 0, ""))
+            return
+        #if connected delivery of files, text and keepalive is possible
+        if not self.connected:
+            #fast start transfer sent by peer right after HS3 confirms handshake, when HS3 was lost or comes later
+            if not (self.accepted and correct and 'faststart' in self.features and
+                    (flags in fragment_replies or flags in parameter_flags)):
+                return
+            self.logger.info('connection', "\nConnected\n")
+            self.on_connected()
+        if flags in fragment_replies:
+            self.on_fragment(msg, correct)
+        elif stream in self.outgoing and flags in fragment_replies[self.outgoing[stream].flag]:
+            self.outgoing[stream].on_reply(msg, correct)
+        #receiver, which can't save acknowledged transfer, rejects it, transfer ends as rejected
+        elif stream in self.outgoing and flags in reject_flags:
+            if correct:
+                self.logger.warning('transfer', "\nStream {} rejected by peer: {}\n", stream,
+                                    msg['data'].decode('utf-8', 'replace'))
+                self.outgoing[stream].finish(None)
+        elif flags == flags_types['FLAG_MSG_PAR']:
+            self.on_parameters(msg, correct, flags_types['FLAG_MSG_FRAG'])
+        elif flags == flags_types['FLAG_DATA_PAR']:
+            self.on_parameters(msg, correct, flags_types['FLAG_DATA'])
+        elif flags == flags_types['FLAG_MSG']:
+            #if correct print content, if corrupted request
+            if correct:
+                text = msg['data'].decode('utf-8', 'replace')
+                self.logger.info('transfer', "\nreceived MSG: {}", text)
+                self.output(f"Peer: {text}")
+                self.engine.received('text', text, self.address)
+                self.send(self.encode(flags_types['FLAG_MSG_ACK'], 0, 0, "", stream))
+            else:
+                self.logger.debug('exchange', "received fault MSG")
+                self.count('reqs_sent')
+                self.send(self.encode(flags_types['FLAG_MSG_REQ'], 0, 0, "", stream))
+        #if exit received, disconnected and send exit ack
+        elif flags == flags_types['FLAG_EXIT'] and correct:
+            self.logger.info('connection', "\nreceived EXIT")
+            self.send(self.encode(flags_types['FLAG_EXIT_ACK'], 0, 0, ""))
+            self.on_disconnected()
+        #if keepalive received send keepalive ack
+        elif flags == flags_types['FLAG_KEEPALIVE'] and correct:
+            self.logger.debug('keepalive', "received KEEPALIVE")
+            self.count('keepalives_received')
+            self.send(self.encode(flags_types['FLAG_KEEPALIVE_ACK'], 0, 0, ""))
+
+    def on_handshake(self, msg):
+        #if HS1 received send HS2
+        if msg['flags'] == flags_types['FLAG_HS1']:
+            self.logger.debug('exchange', "received HS1")
+            #new connection starts with new RTT estimation
+            self.rtt.reset()
+            #chosen checksum and features offered by both peers are sent back in HS2
+            peer_offer = msg['data'].decode('utf-8', 'replace').split(",")
+            self.checksum_type = checksum.negotiate_checksum(peer_offer,
+                                                             checksum.checksum_offer(self.settings['checksum']))
+            self.features = negotiate_features(peer_offer)
+            self.accepted = True
+            self.rtt.start('HS2')
+            choice = ",".join([self.checksum_type] + sorted(self.features))
+            self.send(self.encode(flags_types['FLAG_HS2'], 0, 0, choice))
+            self.logger.debug('exchange', "sent HS2")
+        #if HS2 received send HS3
+        elif msg['flags'] == flags_types['FLAG_HS2']:
+            self.logger.debug('exchange', "received HS2")
+            #peer without negotiation sends empty HS2 and uses CRC16, peer without features sends only checksum
+            chosen, *features = msg['data'].decode('utf-8', 'replace').split(",")
+            self.checksum_type = chosen if chosen in checksum.checksum_types else checksum.DEFAULT_CHECKSUM
+            self.features = negotiate_features(features)
+            self.logger.info('connection', "Checksum: {}\nFeatures: {}", self.checksum_type,
+                             ', '.join(sorted(self.features)) or 'none')
+            self.send(self.encode(flags_types['FLAG_HS3'], 0, 0, ""))
+            self.logger.debug('exchange', "sent HS3")
+            self.on_connected()
+        #if HS3 received connected
+        elif msg['flags'] == flags_types['FLAG_HS3']:
+            self.logger.debug('exchange', "received HS3")
+            self.sample_rtt(self.rtt.finish('HS2'))
+            #transfer following HS3 could have connected already
+            if self.accepted:
+                self.logger.info('connection', "\nConnected\n")
+                self.on_connected()
+
+    #parameters of transfer, receiving starts after acknowledgement
+    def on_parameters(self, msg, correct, flag):
+        stream = msg['stream']
+        ack_flag, req_flag, _ = parameter_replies[msg['flags']]
+        #corrupted parameters, request
+        if not correct:
+            self.logger.debug('exchange', "received fault parameters")
+            self.count('reqs_sent')
+            self.send(self.encode(req_flag, 0, 0, "", stream))
+            return
+        name, codec, identity, resume, changes, fec_group = parse_parameters_data(msg['data'])
+        #sender asks for checkpoint of file before its parameters
+        if resume == checkpoint.PROBE:
+            self.send(self.encode(ack_flag, 0, 0, self.engine.checkpoint_point(name, identity), stream))
+            self.logger.debug('exchange', "sent checkpoint of {}", name)
+            return
+        #sender asks for signatures of copy of file
+        if changes == delta.PROBE:
+            self.send(self.encode(ack_flag, 0, 0, self.offer_signatures(name, stream), stream))
+            self.logger.debug('exchange', "sent signatures offer of {}", name)
+            return
+        #parameters sent again, because acknowledgement was lost,
+        #finished stream isn't started again, stream 0 of peer without streams is reused by every transfer
+        if stream not in self.incoming and (stream == 0 or stream not in self.completed):
+            last_fragment, window_size = msg['fragment_number'], msg['window_size']
+            #codec which wasn't negotiated can't be decompressed
+            if codec is not None and (codec not in self.features or codec not in compress.codecs):
+                self.logger.warning('transfer', "\nreceived parameters with unknown compression {}\n", codec)
+                self.reject_parameters(stream, msg['flags'], f"unknown compression {codec}")
+                return
+            self.logger.info('transfer', "\nreceived parameters:\nStream: {}\nLast fragment number: {}\n"
+                             "Max window size: {}\nCompression: {}\nFEC group: {}\n", stream, last_fragment,
+                             window_size, codec or 'none', fec_group or 'none')
+            #invalid name or file, which can't be opened, is rejected, sender doesn't send it again
+            try:
+                opened = self.open_sink(flag, stream, name, identity, resume, changes)
+            except (OSError, ValueError) as error:
+                self.logger.error('transfer', "\nreceived parameters of {}, which can't be saved: {}\n", name, error)
+                self.reject_parameters(stream, msg['flags'], str(error))
+                return
+            #checkpoint or copy changed after sender verified it, or copy is being received again,
+            #the file can't be continued, sender sends it whole
+            if opened is None:
+                self.logger.warning('transfer', "\nreceived parameters of {}, which doesn't match saved file\n", name)
+                self.reject_parameters(stream, msg['flags'], "saved file changed" if delta.parse_delta(changes) is None
+                                       else "copy missing or being received")
+                return
+            sink, address, offset, saved = opened
+            if address is not None:
+                self.logger.info('transfer', "\nSaving file to {}\nResumed from: {}B\nDelta: {}\n", address, offset,
+                                 'yes' if isinstance(saved, delta.DeltaSink) else 'no')
+            #fragments are decompressed as they are saved in order
+            if codec is not None:
+                sink = compress.DecompressingSink(codec, sink)
+            self.incoming[stream] = IncomingTransfer(self, stream, flag, last_fragment, window_size, sink, address,
+                                                     codec, offset, saved,
+                                                     fec_group if fec_group <= fec.MAX_GROUP else 0)
+            self.completed.pop(stream, None)
+            self.rejected.pop(stream, None)
+            self.update_status()
+        self.send(self.encode(ack_flag, msg['fragment_number'], msg['window_size'], "", stream))
+        self.logger.debug('exchange', "sent parameters ACK")
+        for early in self.take_early(stream):
+            self.on_fragment(early, True)
+
+    #parameters which can't be received are rejected with reason, sender sends transfer again in new stream,
+    #fast start fragments of rejected stream are dropped
+    def reject_parameters(self, stream, flags, reason):
+        self.take_early(stream)
+        self.rejected[stream] = True
+        if len(self.rejected) > COMPLETED_STREAMS:
+            self.rejected.popitem(last=False)
+        self.count('parameters_rejected')
+        self.send(self.encode(parameter_replies[flags][2], 0, 0, reason, stream))
+
+    #transfer, whose fragments can't be saved, is stopped and rejected, so sender stops sending it too
+    def abort_incoming(self, incoming, reason):
+        self.logger.error('transfer', "\nStream {} stopped, fragments can't be saved: {}\n", incoming.stream, reason)
+        incoming.cancel_ack()
+        incoming.sink.close()
+        self.metrics.merge(incoming.metrics)
+        del self.incoming[incoming.stream]
+        self.reject_parameters(incoming.stream, transfer_parameters[incoming.flag], reason)
+        self.update_status()
+
+    #fast start fragments of stream received before its parameters
+    def take_early(self, stream):
+        early = self.early.pop(stream, [])
+        self.early_size -= sum(msg['size'] for msg in early)
+        return early
+
+    #sink of transfer, path of saved file, offset of resumed file and sink, which completes saved file,
+    #None when resume point doesn't match checkpoint, or copy for delta is missing or being received
+    def open_sink(self, flag, stream, name, identity, resume, changes):
+        if flag == flags_types['FLAG_MSG_FRAG']:
+            #bytes are joined and decoded once, character may be split between fragments
+            return io.BytesIO(), None, 0, None
+        #signatures of copy of peer, which were asked for by this side
+        reference = delta.parse_reference(changes)
+        if reference is not None:
+            self.signature_streams[stream] = reference
+            return io.BytesIO(), None, 0, None
+        address = download_path(self.settings['download_address'], name)
+        described = delta.parse_delta(changes)
+        if described is not None:
+            if not os.path.isfile(address) or self.engine.receiving(address):
+                return None
+            sink = delta.DeltaSink(address, *described)
+            return sink, address, 0, sink
+        opened = self.engine.open_file_sink(address, identity, resume)
+        if opened is None:
+            return None
+        sink, address, offset = opened
+        return sink, address, offset, sink if isinstance(sink, checkpoint.CheckpointSink) else None
+
+    def on_fragment(self, msg, correct):
+        stream = msg['stream']
+        incoming = self.incoming.get(stream)
+        if incoming is None or incoming.flag != msg['flags']:
+            #last acknowledgement of finished transfer was lost, late parities aren't acknowledged
+            completed = self.completed.get(stream)
+            if completed and completed[0] == msg['flags'] and correct and msg['fragment_number'] <= completed[1]:
+                self.count('fragments_duplicated')
+                flag, last_fragment = completed
+                self.send(self.encode(fragment_replies[flag][0], last_fragment, 0, b'', stream))
+            #fast start fragment came before parameters of its transfer, fragments which don't fit
+            #into buffer are sent again by sender
+            elif completed is None and incoming is None and correct and stream and 'faststart' in self.features \
+                    and stream not in self.rejected and self.early_size + msg['size'] <= EARLY_BUFFER:
+                self.count('fragments_early')
+                self.early.setdefault(stream, []).append(msg)
+                self.early_size += msg['size']
+            return
+        incoming.on_fragment(msg, correct)
+        if not incoming.done():
+            return
+        self.completed[stream] = (incoming.flag, incoming.last_fragment_number)
+        if len(self.completed) > COMPLETED_STREAMS:
+            self.completed.popitem(last=False)
+        elapsed = time.monotonic() - incoming.start_time
+        self.count('transfers_received')
+        size = incoming.sink.tell() - incoming.offset
+        self.count('payload_bytes_received', size)
+        if incoming.offset:
+            self.count('transfers_resumed')
+        self.on_transfer(transfer_stats('received', size, incoming.last_fragment_number, elapsed, incoming.metrics,
+                                        incoming.codec, incoming.offset))
+        if stream in self.signature_streams:
+            #signatures of copy of peer are passed to sending of file
+            reply = self.signature_requests.get(self.signature_streams.pop(stream))
+            if reply is not None and not reply.done():
+                reply.set_result(incoming.sink.getvalue())
+        elif incoming.flag == flags_types['FLAG_MSG_FRAG']:
+            #message delivered
+            complete_msg = incoming.sink.getvalue()
+            text = complete_msg.decode('utf-8', 'replace')
+            self.output(f"Peer: {text}")
+            self.engine.received('text', text, self.address)
+            self.logger.info('transfer', "Size of text: {}B\n\nMessage delivered\nTime: {}\n", len(complete_msg),
+                             elapsed)
+        elif incoming.saved is not None and not incoming.saved.complete():
+            incoming.sink.close()
+            self.logger.error('transfer', "\nFile {} built from delta doesn't match sent file\n", incoming.address)
+            self.output(f"Peer: file {incoming.address} not saved, it doesn't match sent file")
+        else:
+            incoming.sink.close()
+            self.output(f"Peer: send file-> {incoming.address}")
+            self.engine.received('file', incoming.address, self.address)
+            #file delivered
+            self.logger.info('transfer', "\nFile successfully saved.\nSize of file {}\n\nTime: {}\n",
+                             self.last_transfer['bytes'], elapsed)
+        del self.incoming[stream]
+        self.metrics.merge(incoming.metrics)
+        self.update_status()
+
+
+########################################################################################################################
+#node with one socket running in asyncio event loop, serving connections with peers kept in table by address,
+#output(text) reports results to user, status(connected, sending) state of connections
+#and received(kind, value, peer) received text or path of received file,
+#with peer address node connects to this peer, without it any peer can connect, its address is taken from HS1,
+#max_peers limits number of peers served at once, with reuse_port several processes listen on the same port
+#and received files are created exclusively, so processes never write into the same file,
+#events of protocol are logged by logger, per-packet events at debug level
+class Engine:
+    def __init__(self, local_address, peer_address=None, output=None, status=None, received=None, logger=None,
+                 max_peers=1, reuse_port=False):
+        self.local_address = local_address
+        self.peer_address = peer_address
+        self.max_peers = max(1, max_peers)
+        self.reuse_port = reuse_port
+        self.output = output or (lambda text: None)
+        self.status = status or (lambda connected, sending: None)
+        self.received = received or (lambda kind, value, peer: None)
+        self.logger = logger or Logger()
+        #metrics of all peers, reported by stats
+        self.metrics = Metrics()
+        self.last_transfer = None
+        #summaries of last finished transfers of all peers
+        self.transfers = collections.deque(maxlen=RECENT_TRANSFERS)
+        self.settings = dict(DEFAULT_SETTINGS)
+        #settings are configured delivery is possible
+        self.configured = False
+        self.loop = None
+        self.sock = None
+        self.transport = None
+        self.gso_enabled = False
+        self.gro_enabled = False
+        self.gro_sock = None
+        #DF bit is set on datagrams, so paths of peers can be probed
+        self.dont_fragment = False
+        #address of peer -> connection
+        self.connections = {}
+        if peer_address is not None:
+            self.connections[peer_address] = Connection(self, peer_address)
+        self.watchdog = None
+
+    async def start(self):
+        self.loop = asyncio.get_running_loop()
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, SOCKET_BUFFER)
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, SOCKET_BUFFER)
+        if self.reuse_port:
+            #kernel spreads peers among sockets of the port by hash of their address
+            self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+        self.sock.bind(self.local_address)
+        self.sock.setblocking(False)
+        self.transport, _ = await self.loop.create_datagram_endpoint(lambda: EngineProtocol(self), sock=self.sock)
+        if self.configured:
+            self.apply_offload()
+            self.apply_path_mtu()
+        self.watchdog = self.loop.create_task(self.watch())
+
+    async def close(self):
+        if self.watchdog:
+            self.watchdog.cancel()
+        for connection in self.connections.values():
+            connection.close()
+        if self.gro_enabled:
+            self.stop_coalesced()
+            self.gro_enabled = False
+        if self.transport:
+            self.transport.close()
+
+    #settings are validated and used for next transfers
+    def configure(self, settings):
+        settings = dict(self.settings, **settings)
+        validate_settings(settings)
+        self.settings = settings
+        self.configured = True
+        if self.sock:
+            self.apply_offload()
+            self.apply_path_mtu()
+        self.logger.info(
+            'settings', "\nDownload address: {0[download_address]}\nMax fragment size: {0[max_fragment_size]}\n"
+            "Corruption rate: {0[corruption_rate]}%\nChecksum: {0[checksum]}\n"
+            "Congestion control: {0[congestion_control]}\nRate limit: {0[rate_limit]}B/s\n"
+            "Pacing burst: {0[pacing_burst]}\nUDP offload: {0[udp_offload]}\nWindow size: {0[window_size]}\n"
+            "Compression: {0[compression]}\nDelta sync: {0[delta_sync]}\nFEC: {0[fec]}\n"
+            "Fast start: {0[fast_start]}\nACK every: {0[ack_every]}\nACK delay: {0[ack_delay]}ms\n",
+            settings)
+
+    #offload is used only if kernel supports it, otherwise datagrams are sent and received one by one
+    def apply_offload(self):
+        offload = self.settings['udp_offload'] == 'on'
+        self.gso_enabled = offload and gso.gso_supported(self.sock)
+        gro_enabled = gso.set_gro(self.sock, offload) and offload
+        if offload and not (self.gso_enabled and gro_enabled):
+            self.logger.warning('offload', "UDP offload not supported by system, GSO: {}, GRO: {}", self.gso_enabled,
+                                gro_enabled)
+        #with GRO one read can return several datagrams joined by kernel, so socket is read with recvmsg,
+        #descriptor of transport can't be watched twice, duplicate of it is used instead
+        if gro_enabled and not self.gro_enabled:
+            self.transport.pause_reading()
+            self.gro_sock = self.sock.dup()
+            self.loop.add_reader(self.gro_sock.fileno(), self.read_coalesced)
+        elif self.gro_enabled and not gro_enabled:
+            self.stop_coalesced()
+            self.transport.resume_reading()
+        self.gro_enabled = gro_enabled
+
+    #probes of path MTU must not be fragmented, so DF bit is set when fragment size is discovered
+    def apply_path_mtu(self):
+        self.dont_fragment = pmtu.set_dont_fragment(self.sock, self.settings['max_fragment_size'] == 0)
+
+    def stop_coalesced(self):
+        self.loop.remove_reader(self.gro_sock.fileno())
+        self.gro_sock.close()
+        self.gro_sock = None
+
+    def read_coalesced(self):
+        try:
+            datagrams, addr = gso.receive_segments(self.gro_sock)
+        except (BlockingIOError, InterruptedError):
+            return
+        except OSError:
+            return
+        for datagram in datagrams:
+            self.datagram_received(datagram, addr)
+
+    #state of all connections, connected if any peer is connected
+    def update_status(self):
+        connections = self.connections.values()
+        self.status(any(connection.connected for connection in connections),
+                    any(connection.connected and connection.sending for connection in connections))
+
+    def send(self, encoded, address):
+        self.transport.sendto(encoded, address)
+
+    #fragments are sent in one system call with GSO, kernel splits them into datagrams
+    def send_batch(self, batch, address):
+        if len(batch) > 1 and self.gso_enabled and not self.transport.get_write_buffer_size():
+            try:
+                gso.send_segments(self.sock, batch, address)
+                return
+            except BlockingIOError:
+                pass
+            except OSError as e:
+                #device without checksum offload refuses segmentation, fragments are sent one by one
+                self.gso_enabled = False
+                self.logger.warning('offload', "GSO disabled: {}", e)
+        for encoded in batch:
+            self.transport.sendto(encoded, address)
+
+    ####################################################################################################################
+    #connections
+    #connection with given peer, or with peer given at start
+    def connection(self, peer=None):
+        if peer is None:
+            peer = self.peer_address
+        if peer is None:
+            return None
+        connection = self.connections.get(peer)
+        if connection is None and self.make_room():
+            connection = self.connections[peer] = Connection(self, peer)
+        return connection
+
+    #peers which aren't connected are removed from table when it is full
+    def make_room(self):
+        if len(self.connections) < self.max_peers:
+            return True
+        for address, connection in list(self.connections.items()):
+            if not connection.connected and not connection.busy and address != self.peer_address:
+                del self.connections[address]
+        return len(self.connections) < self.max_peers
+
+    #connection of datagram, new peer is accepted only with HS1
+    def connection_of(self, data, addr):
+        connection = self.connections.get(addr)
+        if connection is not None:
+            return connection
+        #single peer given at start is served from any address
+        if self.peer_address is not None and self.max_peers == 1:
+            return self.connections[self.peer_address]
+        if data[0] != flags_types['FLAG_HS1'] or not self.make_room():
+            return None
+        connection = self.connections[addr] = Connection(self, addr)
+        return connection
+
+    def on_disconnected(self, connection):
+        #peer which connected by itself is forgotten, its address is free for other peers
+        if connection.address != self.peer_address and self.connections.get(connection.address) is connection \
+                and not connection.busy:
+            del self.connections[connection.address]
+
+    #file is being received from some peer
+    def receiving(self, address):
+        return any(incoming.address == address
+                   for connection in self.connections.values() for incoming in connection.incoming.values())
+
+    #resume point of checkpoint of file received earlier, empty when there is none
+    def checkpoint_point(self, name, identity):
+        try:
+            address = download_path(self.settings['download_address'], name)
+        except ValueError:
+            return ''
+        state = checkpoint.load_checkpoint(checkpoint.checkpoint_path(address), identity)
+        if state is None or self.receiving(state['path']):
+            return ''
+        return checkpoint.format_point(state['offset'], state['digest'])
+
+    #file with identity is saved with checkpoints, resumed file continues after prefix saved in its checkpoint,
+    #returns (sink, path of file, offset), None when resume point doesn't match checkpoint
+    def open_file_sink(self, address, identity, resume):
+        path = checkpoint.checkpoint_path(address)
+        if resume:
+            state = checkpoint.load_checkpoint(path, identity)
+            if state is None or self.receiving(state['path']) or \
+                    checkpoint.format_point(state['offset'], state['digest']) != resume:
+                return None
+            file = open(state['path'], 'r+b')
+            file.seek(state['offset'])
+            file.truncate()
+            return checkpoint.CheckpointSink(file, path, state), state['path'], state['offset']
+        file, address = self.open_download(address)
+        if not identity:
+            return file, address, 0
+        #checkpoint of interrupted transfer of the same name is replaced
+        checkpoint.remove_checkpoint(path)
+        state = {'identity': identity, 'path': address, 'offset': 0, 'digest': '', 'previous': ''}
+        return checkpoint.CheckpointSink(file, path, state), address, 0
+
+    #files of the same name received at once are saved separately
+    def open_download(self, address):
+        name, copy = address, 1
+        while True:
+            if not self.receiving(address):
+                try:
+                    return open(address, 'xb' if self.reuse_port else 'wb'), address
+                except FileExistsError:
+                    pass
+            address = f"{name}.{copy}"
+            copy += 1
+
+    #addresses of connected peers
+    def peers(self):
+        return [address for address, connection in self.connections.items() if connection.connected]
+
+    #one watchdog checks all connections, so idle connections don't need their own tasks,
+    #peer is checked with keepalive after idle time, during transfer after inactivity timeout
+    async def watch(self):
+        while True:
+            present_time = time.monotonic()
+            next_check = KEEPALIVE_INTERVAL
+            for connection in list(self.connections.values()):
+                if not connection.connected or connection.keepalive:
+                    continue
+                limit = connection.idle_limit()
+                idle = present_time - connection.last_msg
+                if idle >= limit:
+                    connection.keepalive = self.loop.create_task(connection.keep_alive())
+                else:
+                    next_check = min(next_check, limit - idle)
+            await asyncio.sleep(max(0.01, next_check))
+
+    def datagram_received(self, data, addr):
+        if not self.configured or not data:
+            return
+        connection = self.connection_of(data, addr)
+        if connection is None:
+            self.metrics.count('datagrams_ignored')
+            return
+        connection.datagram_received(data)
+
+    ####################################################################################################################
+    #operations with peer given at start or with given peer
+    async def connect(self, peer=None):
+        connection = self.connection(peer)
+        if connection is None:
+            return False
+        return await connection.connect()
+
+    async def disconnect(self, peer=None):
+        connection = self.connections.get(peer or self.peer_address)
+        if connection is not None:
+            await connection.disconnect()
+
+    async def send_text(self, text, peer=None):
+        connection = self.connections.get(peer or self.peer_address)
+        if connection is None:
+            return False
+        return await connection.send_text(text)
+
+    async def send_file(self, file_path, peer=None):
+        connection = self.connections.get(peer or self.peer_address)
+        if connection is None:
+            return False
+        return await connection.send_file(file_path)
+
+    #metrics of all peers with state and metrics of every connection
+    def stats(self):
+        stats = self.metrics.snapshot([metrics for connection in self.connections.values()
+                                       for metrics in connection.running_metrics()])
+        stats.update(connected=len(self.peers()), last_transfer=self.last_transfer, transfers=list(self.transfers),
+                     peers=[connection.stats() for connection in self.connections.values()])
+        return stats
+
+    #statistics in JSON for monitoring of running node
+    def export_json(self):
+        return to_json(self.stats())
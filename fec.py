@@ -0,0 +1,228 @@
+import math
+import struct
+
+#forward error correction of fragments, sender adds m parity fragments to every group of K data fragments,
+#receiver rebuilds up to m lost or corrupted fragments of group without request,
+#parity j is combination of data fragments with coefficients a_i^j in GF(256), so parity 0 is XOR of group,
+#with more parities code is Reed-Solomon (Vandermonde) code
+DEFAULT_GROUP = 16
+MAX_GROUP = 64
+#parity fragments of group are numbered after the last data fragment, MAX_PARITY numbers for every group
+MAX_PARITY = 8
+#parity starts with number of parities of group and length of its last fragment, only the last fragment
+#of transfer is shorter, fragments are padded with zeros to length of parity
+PARITY_HEADER = struct.Struct('!BH')
+#loss rate observed by receiver is sent in window of acknowledgements in 1/LOSS_SCALE
+LOSS_SCALE = 10000
+#weight of new sample of loss rate
+LOSS_GAIN = 0.125
+
+#GF(256) with polynomial x^8 + x^4 + x^3 + x^2 + 1
+EXP = [0] * 510
+LOG = [0] * 256
+_x = 1
+for _i in range(255):
+    EXP[_i] = EXP[_i + 255] = _x
+    LOG[_x] = _i
+    _x <<= 1
+    if _x & 0x100:
+        _x ^= 0x11d
+
+
+def gf_mul(a, b):
+    if a == 0 or b == 0:
+        return 0
+    return EXP[LOG[a] + LOG[b]]
+
+
+def gf_inverse(a):
+    return EXP[255 - LOG[a]]
+
+
+#byte strings are multiplied by constant with bytes.translate and added (XOR) as integers,
+#so every operation runs over whole fragment in C
+MUL_TABLES = [bytes(gf_mul(c, v) for v in range(256)) for c in range(256)]
+
+
+def coefficient(j, i):
+    return EXP[(i * j) % 255]
+
+
+#sum of fragments multiplied by coefficients, shorter fragments are padded with zeros
+def combine(terms, size):
+    total = 0
+    for c, data in terms:
+        if c == 1:
+            total ^= int.from_bytes(data, 'little')
+        elif c:
+            total ^= int.from_bytes(data.translate(MUL_TABLES[c]), 'little')
+    return total.to_bytes(size, 'little')
+
+
+#inverse of small matrix by Gauss-Jordan elimination, None when it is singular
+def invert(matrix):
+    n = len(matrix)
+    rows = [list(row) + [int(i == k) for k in range(n)] for i, row in enumerate(matrix)]
+    for column in range(n):
+        pivot = next((r for r in range(column, n) if rows[r][column]), None)
+        if pivot is None:
+            return None
+        rows[column], rows[pivot] = rows[pivot], rows[column]
+        scale = gf_inverse(rows[column][column])
+        rows[column] = [gf_mul(scale, v) for v in rows[column]]
+        for r in range(n):
+            factor = rows[r][column]
+            if r != column and factor:
+                rows[r] = [v ^ gf_mul(factor, p) for v, p in zip(rows[r], rows[column])]
+    return [row[n:] for row in rows]
+
+
+#parities of group of fragments
+def encode_parity(fragments, m):
+    size = max(len(fragment) for fragment in fragments)
+    return [combine([(coefficient(j, i), fragment) for i, fragment in enumerate(fragments)], size)
+            for j in range(m)]
+
+
+def parity_number(last_fragment_number, group, j):
+    return last_fragment_number + 1 + group * MAX_PARITY + j
+
+
+#setting off, auto (parities follow loss rate reported by receiver) or K:m, returns None when FEC is off,
+#otherwise (group size, parities or None for auto), wrong value raises ValueError
+def parse_setting(text):
+    if text == 'off':
+        return None
+    if text == 'auto':
+        return DEFAULT_GROUP, None
+    group, _, parity = text.partition(':')
+    group, parity = int(group), int(parity)
+    if not 1 <= group <= MAX_GROUP or not 1 <= parity <= MAX_PARITY:
+        raise ValueError(f"FEC group must be between 1 and {MAX_GROUP} and parities between 1 and {MAX_PARITY}")
+    return group, parity
+
+
+#smallest number of parities covering losses of group with margin of two standard deviations
+def parity_for_loss(loss, group):
+    if loss <= 0:
+        return 0
+    for m in range(1, MAX_PARITY + 1):
+        sent = group + m
+        if m >= sent * loss + 2 * math.sqrt(sent * loss * (1 - loss)):
+            return m
+    return MAX_PARITY
+
+
+#fragments and parities of one group kept by receiver until the group is complete
+class FecGroup:
+    def __init__(self):
+        self.data = {}
+        self.parities = {}
+        #length of the last data fragment, known from parity
+        self.last_length = 0
+        #highest index of data fragment which arrived, corrupted or not
+        self.highest = -1
+        #the last parity or fragment sent again arrived, holes of group are requested if it can't be rebuilt
+        self.closed = False
+        #data fragments received after group was closed, they were retransmitted
+        self.late = 0
+
+
+#groups of received transfer, data fragments are kept until their group is complete,
+#missing ones are rebuilt when enough parities arrive
+class FecDecoder:
+    def __init__(self, group_size, last_fragment_number):
+        self.group_size = group_size
+        self.last_fragment_number = last_fragment_number
+        self.groups = {}
+        #highest group with received data, holes of earlier groups are requested
+        self.highest_group = -1
+        #loss rate of data fragments, fragments rebuilt or received after their group was closed were lost
+        self.loss = 0.0
+
+    def size_of(self, group):
+        return min(self.group_size, self.last_fragment_number + 1 - group * self.group_size)
+
+    def state(self, group):
+        state = self.groups.get(group)
+        if state is None:
+            state = self.groups[group] = FecGroup()
+        return state
+
+    def closed(self, group):
+        state = self.groups.get(group)
+        return group < self.highest_group or (state is not None and state.closed)
+
+    #group of fragment still waits for its parities, its holes aren't requested yet
+    def pending(self, frag_num):
+        return not self.closed(frag_num // self.group_size)
+
+    #every data fragment, corrupted one too, fragment arriving again was sent again after timeout,
+    #so parities of its group were already sent
+    def arrived(self, frag_num):
+        group, index = divmod(frag_num, self.group_size)
+        state = self.state(group)
+        if index <= state.highest:
+            state.closed = True
+        else:
+            state.highest = index
+        self.highest_group = max(self.highest_group, group)
+
+    #data fragment received correctly, returns list of (fragment number, data) of rebuilt fragments
+    def add_data(self, frag_num, data):
+        group, index = divmod(frag_num, self.group_size)
+        state = self.state(group)
+        if index in state.data:
+            return []
+        if self.closed(group):
+            state.late += 1
+        state.data[index] = data
+        return self.recover(group, state)
+
+    def add_parity(self, frag_num, data):
+        group, j = divmod(frag_num - self.last_fragment_number - 1, MAX_PARITY)
+        if len(data) < PARITY_HEADER.size or group * self.group_size > self.last_fragment_number:
+            return []
+        state = self.state(group)
+        count, state.last_length = PARITY_HEADER.unpack_from(data)
+        #the last parity of group closes it, when it is lost, group is closed by data of next group
+        state.closed = state.closed or j + 1 >= count
+        if j < count:
+            state.parities[j] = data[PARITY_HEADER.size:]
+        return self.recover(group, state)
+
+    def recover(self, group, state):
+        size = self.size_of(group)
+        if len(state.data) == size:
+            self.complete(group, state.late)
+            return []
+        if len(state.data) + len(state.parities) < size:
+            return []
+        missing = [i for i in range(size) if i not in state.data]
+        rows = sorted(state.parities)[:len(missing)]
+        inverse = invert([[coefficient(j, i) for i in missing] for j in rows])
+        if inverse is None:
+            return []
+        length = len(state.parities[rows[0]])
+        #parity minus received fragments leaves combination of missing ones
+        syndromes = [combine([(1, state.parities[j])] +
+                             [(coefficient(j, i), fragment) for i, fragment in state.data.items()], length)
+                     for j in rows]
+        rebuilt = []
+        for r, i in enumerate(missing):
+            fragment = combine([(inverse[r][k], syndrome) for k, syndrome in enumerate(syndromes)], length)
+            frag_num = group * self.group_size + i
+            if frag_num == self.last_fragment_number:
+                fragment = fragment[:state.last_length]
+            rebuilt.append((frag_num, fragment))
+        self.complete(group, state.late + len(missing))
+        return rebuilt
+
+    def complete(self, group, lost):
+        self.loss += LOSS_GAIN * (lost / self.size_of(group) - self.loss)
+        del self.groups[group]
+
+    #groups saved before rn don't need their fragments, late parities of completed groups are dropped
+    def discard(self, rn):
+        for group in [group for group in self.groups if (group + 1) * self.group_size <= rn]:
+            del self.groups[group]
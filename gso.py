@@ -0,0 +1,62 @@
+import socket
+import struct
+import sys
+
+#Linux UDP segmentation offload, kernel splits one large buffer into datagrams of equal size (GSO)
+#and joins datagrams of one flow into one buffer on receive (GRO)
+SOL_UDP = getattr(socket, 'SOL_UDP', 17)
+UDP_SEGMENT = getattr(socket, 'UDP_SEGMENT', 103)
+UDP_GRO = getattr(socket, 'UDP_GRO', 104)
+#kernel limits number of segments and size of buffer
+MAX_SEGMENTS = 64
+MAX_BUFFER = 65507
+#buffer for coalesced datagrams
+GRO_BUFFER = 65535
+
+
+#checking if kernel supports sending with UDP_SEGMENT
+def gso_supported(sock):
+    if not sys.platform.startswith('linux') or not hasattr(sock, 'sendmsg'):
+        return False
+    try:
+        sock.setsockopt(SOL_UDP, UDP_SEGMENT, 0)
+        return True
+    except OSError:
+        return False
+
+
+#enabling or disabling UDP_GRO, False if kernel doesn't support it
+def set_gro(sock, enabled):
+    if not sys.platform.startswith('linux') or not hasattr(sock, 'recvmsg'):
+        return False
+    try:
+        sock.setsockopt(SOL_UDP, UDP_GRO, 1 if enabled else 0)
+        return True
+    except OSError:
+        return False
+
+
+#number of datagrams of given size in one buffer
+def max_segments(segment_size):
+    return max(1, min(MAX_SEGMENTS, MAX_BUFFER // max(1, segment_size)))
+
+
+#datagrams have to be of the same size, only last can be shorter
+def send_segments(sock, datagrams, address):
+    if len(datagrams) == 1:
+        return sock.sendto(datagrams[0], address)
+    segment_size = len(datagrams[0])
+    return sock.sendmsg([b''.join(datagrams)], [(SOL_UDP, UDP_SEGMENT, struct.pack('=H', segment_size))], 0,
+                        address)
+
+
+#receiving buffer and splitting it into original datagrams
+def receive_segments(sock):
+    data, ancdata, flags, addr = sock.recvmsg(GRO_BUFFER, socket.CMSG_SPACE(4))
+    segment_size = 0
+    for level, kind, value in ancdata:
+        if level == SOL_UDP and kind == UDP_GRO:
+            segment_size = struct.unpack('=i', value[:4])[0]
+    if not segment_size or segment_size >= len(data):
+        return [data], addr
+    return [data[i:i + segment_size] for i in range(0, len(data), segment_size)], addr
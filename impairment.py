@@ -0,0 +1,251 @@
+# UDP relay between two peers on localhost, which impairs datagrams in each direction
+# peer A sends to --listen-a, peer B to --listen-b, datagrams are forwarded to the other peer:
+#   python impairment.py --listen-a 127.0.0.1:6000 --peer-b 127.0.0.1:5001 --listen-b 127.0.0.1:6001 \
+#       --peer-a 127.0.0.1:5000 --profile lossy --b-to-a loss=0,delay=20 --seed 1
+# without --peer-a, address of peer A is taken from its first datagram
+import argparse
+import asyncio
+import collections
+import json
+import random
+import sys
+
+#impairment of one direction, rates in %, times in milliseconds, bandwidth in KB/s (0 = unlimited)
+DEFAULT_IMPAIRMENT = {
+    'loss': 0.0,
+    'duplicate': 0.0,
+    'reorder': 0.0,
+    #reordered datagram is held back, so following datagrams overtake it
+    'reorder_delay': 10.0,
+    'corrupt': 0.0,
+    'delay': 0.0,
+    'jitter': 0.0,
+    'bandwidth': 0.0,
+    #bytes waiting for bottleneck, datagrams over it are dropped
+    'queue': 64 * 1024,
+    #link is down for outage_for every outage_every milliseconds (0 = never)
+    'outage_every': 0.0,
+    'outage_for': 0.0}
+
+#named impairments, missing parameters have default values
+profiles = {
+    'clean': {},
+    'lan': {'delay': 0.5, 'jitter': 0.1},
+    'wifi': {'loss': 1, 'duplicate': 0.1, 'reorder': 0.5, 'delay': 5, 'jitter': 3, 'bandwidth': 5000},
+    'lossy': {'loss': 5, 'duplicate': 1, 'reorder': 2, 'delay': 20, 'jitter': 5},
+    'satellite': {'loss': 0.5, 'delay': 300, 'jitter': 10, 'bandwidth': 1000, 'queue': 256 * 1024},
+    'flaky': {'loss': 2, 'delay': 10, 'outage_every': 10000, 'outage_for': 3000}}
+
+
+#wrong value raises ValueError
+def validate_impairment(impairment):
+    for name, value in impairment.items():
+        if name not in DEFAULT_IMPAIRMENT:
+            raise ValueError(f"unknown impairment {name}")
+        if value < 0:
+            raise ValueError(f"{name} can't be negative")
+    for name in ('loss', 'duplicate', 'reorder', 'corrupt'):
+        if impairment.get(name, 0) > 100:
+            raise ValueError(f"{name} must be between 0 and 100%")
+    if impairment.get('outage_for', 0) > impairment.get('outage_every', 0):
+        raise ValueError("outage can't be longer than its period")
+
+
+#profile name or parameters in form loss=2,delay=20, parameters are applied over profile
+def parse_impairment(text, base=None):
+    impairment = dict(DEFAULT_IMPAIRMENT, **(base or {}))
+    for item in filter(None, text.split(',')):
+        if '=' not in item:
+            if item not in profiles:
+                raise ValueError(f"unknown profile {item}")
+            impairment.update(profiles[item])
+            continue
+        name, _, value = item.partition('=')
+        impairment[name.strip()] = float(value)
+    validate_impairment(impairment)
+    return impairment
+
+
+#one direction of relay, decisions are drawn from its own seeded generator,
+#so the same sequence of datagrams is impaired the same way in every run
+class Link:
+    def __init__(self, impairment=None, seed=0):
+        self.impairment = dict(DEFAULT_IMPAIRMENT, **(impairment or {}))
+        validate_impairment(self.impairment)
+        self.rng = random.Random(seed)
+        self.counters = collections.Counter()
+        #time when bottleneck sends the last waiting byte
+        self.busy_until = 0.0
+        self.start = None
+
+    def down(self, now):
+        every = self.impairment['outage_every']
+        if not every:
+            return False
+        #link is up at start of every period and down at its end
+        return (now - self.start) * 1000 % every >= every - self.impairment['outage_for']
+
+    #datagram arrived at time now (seconds), returns (delay in seconds, data) of every copy to deliver
+    def schedule(self, data, now):
+        impairment = self.impairment
+        rng = self.rng
+        self.counters['received'] += 1
+        if self.start is None:
+            self.start = now
+        if self.down(now):
+            self.counters['outage_dropped'] += 1
+            return []
+        if impairment['loss'] and rng.random() * 100 < impairment['loss']:
+            self.counters['lost'] += 1
+            return []
+        if impairment['corrupt'] and data and rng.random() * 100 < impairment['corrupt']:
+            corrupted = bytearray(data)
+            corrupted[rng.randrange(len(corrupted))] ^= 1 << rng.randrange(8)
+            data = bytes(corrupted)
+            self.counters['corrupted'] += 1
+        delay = impairment['delay']
+        if impairment['jitter']:
+            delay = max(0.0, delay + rng.uniform(-impairment['jitter'], impairment['jitter']))
+        delay /= 1000
+        #bottleneck sends datagrams one after another, full queue drops new ones
+        if impairment['bandwidth']:
+            rate = impairment['bandwidth'] * 1000
+            start = max(now, self.busy_until)
+            if (start - now) * rate + len(data) > impairment['queue']:
+                self.counters['queue_dropped'] += 1
+                return []
+            self.busy_until = start + len(data) / rate
+            delay += self.busy_until - now
+        if impairment['reorder'] and rng.random() * 100 < impairment['reorder']:
+            delay += impairment['reorder_delay'] / 1000
+            self.counters['reordered'] += 1
+        copies = [(delay, data)]
+        if impairment['duplicate'] and rng.random() * 100 < impairment['duplicate']:
+            copies.append((delay, data))
+            self.counters['duplicated'] += 1
+        self.counters['forwarded'] += len(copies)
+        return copies
+
+
+class RelayProtocol(asyncio.DatagramProtocol):
+    def __init__(self, on_datagram):
+        self.on_datagram = on_datagram
+
+    def datagram_received(self, data, addr):
+        self.on_datagram(data, addr)
+
+
+#relay with socket for each peer, datagram received by socket of one peer is impaired
+#and sent to the other peer from socket of that peer, so every peer talks only to its own relay address
+class Proxy:
+    def __init__(self, listen_a, peer_b, listen_b=('127.0.0.1', 0), peer_a=None, a_to_b=None, b_to_a=None, seed=0):
+        self.listen_a = listen_a
+        self.listen_b = listen_b
+        self.peer_a = peer_a
+        self.peer_b = peer_b
+        #every direction has its own generator
+        self.links = {'a_to_b': Link(a_to_b, seed), 'b_to_a': Link(b_to_a, seed + 1)}
+        self.loop = None
+        self.transport_a = None
+        self.transport_b = None
+
+    async def start(self):
+        self.loop = asyncio.get_running_loop()
+        self.transport_a, _ = await self.loop.create_datagram_endpoint(lambda: RelayProtocol(self.from_a),
+                                                                       local_addr=self.listen_a)
+        self.transport_b, _ = await self.loop.create_datagram_endpoint(lambda: RelayProtocol(self.from_b),
+                                                                       local_addr=self.listen_b)
+        #ports chosen by system
+        self.listen_a = self.transport_a.get_extra_info('sockname')
+        self.listen_b = self.transport_b.get_extra_info('sockname')
+
+    def close(self):
+        for transport in (self.transport_a, self.transport_b):
+            if transport:
+                transport.close()
+
+    def from_a(self, data, addr):
+        if self.peer_a is None:
+            self.peer_a = addr
+        self.forward(self.links['a_to_b'], data, self.transport_b, self.peer_b)
+
+    def from_b(self, data, addr):
+        if self.peer_a is not None:
+            self.forward(self.links['b_to_a'], data, self.transport_a, self.peer_a)
+
+    def forward(self, link, data, transport, address):
+        for delay, copy in link.schedule(data, self.loop.time()):
+            if delay > 0:
+                self.loop.call_later(delay, self.send, transport, copy, address)
+            else:
+                self.send(transport, copy, address)
+
+    @staticmethod
+    def send(transport, data, address):
+        if not transport.is_closing():
+            transport.sendto(data, address)
+
+    #counters of both directions
+    def stats(self):
+        return {name: dict(link.counters) for name, link in self.links.items()}
+
+
+#address in form host:port
+def address(value):
+    host, _, port = value.rpartition(':')
+    if not host:
+        raise argparse.ArgumentTypeError(f"{value} is not in form host:port")
+    return host, int(port)
+
+
+async def run(args, a_to_b, b_to_a):
+    proxy = Proxy(args.listen_a, args.peer_b, args.listen_b, args.peer_a, a_to_b, b_to_a, args.seed)
+    await proxy.start()
+    print(f"A -> {proxy.listen_a[0]}:{proxy.listen_a[1]} -> B {args.peer_b[0]}:{args.peer_b[1]}\n"
+          f"B -> {proxy.listen_b[0]}:{proxy.listen_b[1]} -> A "
+          f"{f'{args.peer_a[0]}:{args.peer_a[1]}' if args.peer_a else 'address of first datagram'}", flush=True)
+    try:
+        elapsed = 0.0
+        while not args.duration or elapsed < args.duration:
+            await asyncio.sleep(args.stats_interval or 1.0)
+            elapsed += args.stats_interval or 1.0
+            if args.stats_interval:
+                print(json.dumps(proxy.stats()), flush=True)
+    finally:
+        print(json.dumps(proxy.stats()), flush=True)
+        proxy.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="UDP relay with seeded loss, reordering, duplication, delay, "
+                                                 "bandwidth limit and outages in each direction")
+    parser.add_argument('--listen-a', type=address, required=True, help="address used by peer A as its peer")
+    parser.add_argument('--peer-b', type=address, required=True, help="address of peer B")
+    parser.add_argument('--listen-b', type=address, default=('127.0.0.1', 0), help="address used by peer B")
+    parser.add_argument('--peer-a', type=address, help="address of peer A, default is source of its first datagram")
+    parser.add_argument('--profile', default='clean', help=f"impairment of both directions: {', '.join(profiles)}")
+    parser.add_argument('--a-to-b', default='', help="impairment from A to B over profile, e.g. loss=2,delay=20")
+    parser.add_argument('--b-to-a', default='', help="impairment from B to A over profile")
+    parser.add_argument('--seed', type=int, default=0, help="seed of random decisions, directions use seed and seed+1")
+    parser.add_argument('--duration', type=float, default=0, help="seconds to run, 0 = until interrupted")
+    parser.add_argument('--stats-interval', type=float, default=0, help="seconds between printed counters")
+    args = parser.parse_args(argv)
+    try:
+        base = parse_impairment(args.profile)
+        a_to_b = parse_impairment(args.a_to_b, base)
+        b_to_a = parse_impairment(args.b_to_a, base)
+    except ValueError as e:
+        print(f"Wrong impairment: {e}", file=sys.stderr)
+        return 2
+    try:
+        asyncio.run(run(args, a_to_b, b_to_a))
+    except OSError as e:
+        print(e, file=sys.stderr)
+        return 1
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,109 @@
+import collections
+import functools
+import sys
+import threading
+import time
+
+#levels of log records, per-packet events are logged at debug level
+DEBUG = 10
+INFO = 20
+WARNING = 30
+ERROR = 40
+OFF = 100
+levels = {'debug': DEBUG, 'info': INFO, 'warning': WARNING, 'error': ERROR, 'off': OFF}
+
+#records waiting for writer, the oldest ones are dropped when writer doesn't keep up
+RING_CAPACITY = 65536
+#seconds between writes of waiting records
+FLUSH_INTERVAL = 0.05
+
+
+#leveled logger, records are formatted and written by background thread,
+#caller only appends tuple of message and arguments into ring buffer,
+#so record costs one append and disabled level costs one call of empty function,
+#sampling logs every n-th record of event type, rate limit at most n records of event type per second
+class Logger:
+    def __init__(self, level=INFO, stream=None, sampling=None, rate_limits=None, capacity=RING_CAPACITY):
+        self.stream = stream
+        self.sampling = dict(sampling or {})
+        self.rate_limits = dict(rate_limits or {})
+        #event type -> number of records seen, records in current second and start of second
+        self.seen = collections.Counter()
+        self.windows = {}
+        #deque with maximal length is ring buffer, append and popleft are atomic without lock
+        self.records = collections.deque(maxlen=capacity)
+        self.dropped = 0
+        self.writer = None
+        self.closed = threading.Event()
+        self.set_level(level)
+
+    #debug(event, message, *args), info, warning and error log at their level,
+    #methods of disabled levels are replaced with empty function
+    def set_level(self, level):
+        self.level = levels[level] if isinstance(level, str) else level
+        for name, value in (('debug', DEBUG), ('info', INFO), ('warning', WARNING), ('error', ERROR)):
+            setattr(self, name, functools.partial(self.log, value) if value >= self.level else self.disabled)
+
+    def enabled(self, level):
+        return level >= self.level
+
+    def disabled(self, event, message, *args):
+        pass
+
+    #sampled and rate limited record is put into ring buffer, message is formatted with arguments by writer
+    def log(self, level, event, message, *args):
+        if level < self.level:
+            return
+        if self.sampling:
+            every = self.sampling.get(event, 1)
+            if every > 1:
+                self.seen[event] += 1
+                if self.seen[event] % every != 1:
+                    return
+        if self.rate_limits:
+            limit = self.rate_limits.get(event)
+            if limit is not None:
+                second = int(time.monotonic())
+                start, count = self.windows.get(event, (second, 0))
+                if start != second:
+                    start, count = second, 0
+                if count >= limit:
+                    return
+                self.windows[event] = (start, count + 1)
+        if len(self.records) == self.records.maxlen:
+            self.dropped += 1
+        self.records.append((message, args))
+        if self.writer is None:
+            self.start()
+
+    def start(self):
+        self.writer = threading.Thread(target=self.write_records, daemon=True)
+        self.writer.start()
+
+    #background thread writes records in batches
+    def write_records(self):
+        while not self.closed.wait(FLUSH_INTERVAL):
+            self.flush()
+        self.flush()
+
+    def flush(self):
+        records = self.records
+        lines = []
+        while records:
+            message, args = records.popleft()
+            lines.append(message.format(*args) if args else message)
+        if self.dropped:
+            lines.append(f"{self.dropped} log records dropped")
+            self.dropped = 0
+        if lines:
+            stream = self.stream or sys.stdout
+            stream.write("\n".join(lines) + "\n")
+            stream.flush()
+
+    #waiting records are written before end of program
+    def close(self):
+        self.closed.set()
+        if self.writer is not None:
+            self.writer.join()
+        else:
+            self.flush()
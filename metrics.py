@@ -0,0 +1,125 @@
+import bisect
+import collections
+import json
+
+#upper bounds of histogram buckets, RTT in seconds, window occupancy in fragments
+RTT_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0,
+               10.0, 30.0)
+WINDOW_BUCKETS = tuple(2 ** i for i in range(17))
+buckets = {'rtt': RTT_BUCKETS, 'window_occupancy': WINDOW_BUCKETS}
+#quantiles reported by snapshot of histogram
+QUANTILES = (0.5, 0.9, 0.99)
+
+
+#distribution of values in fixed buckets, observation costs one binary search,
+#quantiles are estimated by upper bound of bucket
+class Histogram:
+    def __init__(self, bounds):
+        self.bounds = bounds
+        #last bucket counts values over the highest bound
+        self.counts = [0] * (len(bounds) + 1)
+        self.count = 0
+        self.sum = 0
+        self.min = None
+        self.max = None
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.sum += value
+        if self.min is None or value < self.min:
+            self.min = value
+        if self.max is None or value > self.max:
+            self.max = value
+
+    def add(self, other):
+        for index, count in enumerate(other.counts):
+            self.counts[index] += count
+        self.count += other.count
+        self.sum += other.sum
+        if other.min is not None and (self.min is None or other.min < self.min):
+            self.min = other.min
+        if other.max is not None and (self.max is None or other.max > self.max):
+            self.max = other.max
+
+    def quantile(self, q):
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if count and seen >= rank:
+                return min(self.bounds[index], self.max) if index < len(self.bounds) else self.max
+        return self.max
+
+    def snapshot(self):
+        snapshot = {'count': self.count, 'sum': self.sum, 'mean': self.sum / self.count if self.count else None,
+                    'min': self.min, 'max': self.max}
+        for q in QUANTILES:
+            snapshot[f"p{round(q * 100)}"] = self.quantile(q)
+        #only used buckets, keyed by their upper bound
+        snapshot['buckets'] = {str(self.bounds[index]) if index < len(self.bounds) else 'inf': count
+                               for index, count in enumerate(self.counts) if count}
+        return snapshot
+
+
+#counters and histograms of one transfer, connection or engine, values of connection are added also to parent,
+#so engine holds totals of all peers, transfer counts only into itself, because it is updated for every fragment,
+#its values are merged into connection when transfer ends and added to snapshot while it runs
+class Metrics:
+    def __init__(self, parent=None):
+        self.parent = parent
+        self.counters = collections.Counter()
+        self.histograms = {}
+
+    def count(self, name, value=1):
+        metrics = self
+        while metrics is not None:
+            metrics.counters[name] += value
+            metrics = metrics.parent
+
+    def histogram(self, name):
+        histogram = self.histograms.get(name)
+        if histogram is None:
+            histogram = self.histograms[name] = Histogram(buckets.get(name, WINDOW_BUCKETS))
+        return histogram
+
+    def observe(self, name, value):
+        metrics = self
+        while metrics is not None:
+            metrics.histogram(name).observe(value)
+            metrics = metrics.parent
+
+    #values of other metrics are added only to this one
+    def add(self, other):
+        self.counters.update(other.counters)
+        for name, histogram in other.histograms.items():
+            self.histogram(name).add(histogram)
+
+    #values of finished transfer are added to this metrics and its parents
+    def merge(self, other):
+        metrics = self
+        while metrics is not None:
+            metrics.add(other)
+            metrics = metrics.parent
+
+    #copy of counters with summaries of histograms, values of running transfers are included,
+    #snapshot doesn't change when metrics are updated
+    def snapshot(self, running=()):
+        total = self
+        if running:
+            total = Metrics()
+            total.add(self)
+            for metrics in running:
+                total.add(metrics)
+        snapshot = dict(total.counters)
+        if total.histograms:
+            snapshot['histograms'] = {name: histogram.snapshot() for name, histogram in total.histograms.items()
+                                      if histogram.count}
+        return snapshot
+
+
+#snapshot in JSON, addresses of peers are lists
+def to_json(snapshot):
+    return json.dumps(snapshot, default=str)
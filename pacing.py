@@ -0,0 +1,40 @@
+import time
+
+
+#token bucket spacing out datagrams to target rate,
+#at most burst bytes can be sent at once, rate 0 means no pacing
+class TokenBucket:
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = max(1, burst)
+        self.tokens = float(self.burst)
+        self.last = time.monotonic()
+
+    def set_rate(self, rate):
+        self.refill()
+        self.rate = rate
+
+    def refill(self):
+        present_time = time.monotonic()
+        if self.rate:
+            self.tokens = min(self.burst, self.tokens + (present_time - self.last) * self.rate)
+        else:
+            self.tokens = float(self.burst)
+        self.last = present_time
+
+    #seconds to wait before size bytes can be sent
+    def delay(self, size):
+        if not self.rate:
+            return 0.0
+        self.refill()
+        #datagram bigger than burst is sent, when bucket is full
+        needed = min(size, self.burst)
+        if self.tokens >= needed:
+            return 0.0
+        return (needed - self.tokens) / self.rate
+
+    #bytes were sent, retransmissions can take tokens, that aren't available yet
+    def consume(self, size):
+        if self.rate:
+            self.refill()
+            self.tokens -= size
@@ -0,0 +1,35 @@
+import socket
+import sys
+
+#path MTU discovery, after handshake padded probes of sizes of common MTUs are sent with DF bit set,
+#the largest acknowledged probe is the largest datagram of the path
+#IPv4 and UDP headers, datagram of MTU 1500 has 1472 bytes
+IP_UDP_HEADER = 28
+#largest UDP datagram over IPv4
+MAX_DATAGRAM = 65507
+#IPv6 minimum, tunnels (WireGuard), Ethernet, jumbo frames and loopback
+MTUS = (1280, 1420, 1500, 9000, 65536)
+SIZES = tuple(min(mtu - IP_UDP_HEADER, MAX_DATAGRAM) for mtu in MTUS)
+#probing starts with Ethernet, then continues up until probe is lost, or down until probe is acknowledged
+START_SIZE = 1500 - IP_UDP_HEADER
+#lost probe is sent again once, probe lost twice is too big
+PROBE_TRIES = 2
+
+#Linux socket options, datagram with DF bit isn't fragmented, PROBE mode ignores path MTU cached by kernel,
+#so probes larger than it aren't refused
+IP_MTU_DISCOVER = getattr(socket, 'IP_MTU_DISCOVER', 10)
+IP_PMTUDISC_WANT = getattr(socket, 'IP_PMTUDISC_WANT', 1)
+IP_PMTUDISC_PROBE = getattr(socket, 'IP_PMTUDISC_PROBE', 3)
+
+
+#DF bit is set on datagrams of socket when fragment size is discovered, manual fragment size uses default
+#of system, which fragments datagrams larger than path, returns True when DF bit is set
+def set_dont_fragment(sock, enabled):
+    if not sys.platform.startswith('linux'):
+        return False
+    try:
+        sock.setsockopt(socket.IPPROTO_IP, IP_MTU_DISCOVER, IP_PMTUDISC_PROBE if enabled else IP_PMTUDISC_WANT)
+        return enabled
+    except OSError:
+        return False
+
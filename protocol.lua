@@ -15,12 +15,36 @@ local f_flag_additional = ProtoField.bool("myprotocol.flags.additional", "Additi
 local f_frag_num = ProtoField.uint32("myprotocol.fragment_number", "Fragment Number", base.DEC)
 local f_window_size = ProtoField.uint16("myprotocol.window_size", "Window Size", base.DEC)
 local f_checksum = ProtoField.uint16("myprotocol.checksum", "Checksum", base.DEC)
+local f_checksum32 = ProtoField.uint32("myprotocol.checksum32", "Checksum (CRC32)", base.HEX)
+local f_stream = ProtoField.uint16("myprotocol.stream", "Stream", base.DEC)
 local f_data = ProtoField.string("myprotocol.data", "Data")
+local f_sack = ProtoField.bytes("myprotocol.sack", "SACK Bitmap")
+local f_sack_fragment = ProtoField.uint32("myprotocol.sack.fragment", "Received Fragment", base.DEC)
 
 myprotocol.fields = {
     f_flags, f_flag_handshake, f_flag_exit, f_flag_keepalive, f_flag_data,
     f_flag_ack, f_flag_req, f_flag_msg, f_flag_additional,
-    f_frag_num, f_window_size, f_checksum, f_data
+    f_frag_num, f_window_size, f_checksum, f_checksum32, f_stream, f_data, f_sack, f_sack_fragment
+}
+
+-- checksum negotiated during handshake, handshake itself always uses CRC16
+myprotocol.prefs.checksum32 = Pref.bool("32-bit checksum", false, "Peers negotiated CRC32 checksum in handshake")
+-- with streams negotiated in handshake, stream identifier follows checksum
+myprotocol.prefs.streams = Pref.bool("Streams", true, "Peers negotiated streams in handshake")
+
+local handshake_flags = {
+    [0x80] = true,
+    [0x88] = true,
+    [0x89] = true
+}
+
+-- acks and requests of fragments carry SACK bitmap in data
+-- first bit is fragment after first missing fragment (ack number + 1 or requested number)
+local sack_flags = {
+    [0x18] = true,
+    [0x14] = true,
+    [0x1A] = true,
+    [0x16] = true
 }
 
 -- flags types
@@ -32,16 +56,20 @@ local flag_types = {
     [0x48] = "FLAG_EXIT_ACK",
     [0x20] = "FLAG_KEEPALIVE",
     [0x28] = "FLAG_KEEPALIVE_ACK",
+    [0x21] = "FLAG_PROBE",
+    [0x29] = "FLAG_PROBE_ACK",
     [0x12] = "FLAG_MSG",
     [0x1A] = "FLAG_MSG_ACK",
     [0x16] = "FLAG_MSG_REQ",
     [0x92] = "FLAG_MSG_PAR",
     [0x9A] = "FLAG_MSG_PAR_ACK",
     [0x96] = "FLAG_MSG_PAR_REQ",
+    [0x9E] = "FLAG_MSG_PAR_REJ",
     [0x13] = "FLAG_MSG_FRAG",
     [0x90] = "FLAG_DATA_PAR",
     [0x98] = "FLAG_DATA_PAR_ACK",
     [0x94] = "FLAG_DATA_PAR_REQ",
+    [0x9C] = "FLAG_DATA_PAR_REJ",
     [0x10] = "FLAG_DATA",
     [0x18] = "FLAG_DATA_ACK",
     [0x14] = "FLAG_DATA_REQ"
@@ -77,12 +105,39 @@ function myprotocol.dissector(buffer, pinfo, tree)
     -- other fields
     subtree:add(f_frag_num, buffer(1, 4))
     subtree:add(f_window_size, buffer(5, 2))
-    subtree:add(f_checksum, buffer(7, 2))
+    local header_length = 9
+    if myprotocol.prefs.checksum32 and not handshake_flags[flags] and buffer:len() >= 11 then
+        subtree:add(f_checksum32, buffer(7, 4))
+        header_length = 11
+    else
+        subtree:add(f_checksum, buffer(7, 2))
+    end
+    if myprotocol.prefs.streams and not handshake_flags[flags] and buffer:len() >= header_length + 2 then
+        subtree:add(f_stream, buffer(header_length, 2))
+        header_length = header_length + 2
+    end
 
     -- if data is available, show field data
-    local data_length = buffer:len() - 9
-    if data_length > 0 then
-        subtree:add(f_data, buffer(9, data_length))
+    local data_length = buffer:len() - header_length
+    if data_length > 0 and sack_flags[flags] then
+        local first_missing = buffer(1, 4):uint()
+        if bit.band(flags, 0x08) ~= 0 then
+            first_missing = first_missing + 1
+        end
+        local sack_tree = subtree:add(f_sack, buffer(header_length, data_length))
+        local received = 0
+        for i = 0, data_length - 1 do
+            local byte = buffer(header_length + i, 1):uint()
+            for b = 0, 7 do
+                if bit.band(byte, bit.rshift(0x80, b)) ~= 0 then
+                    sack_tree:add(f_sack_fragment, buffer(header_length + i, 1), first_missing + 1 + i * 8 + b)
+                    received = received + 1
+                end
+            end
+        end
+        sack_tree:append_text(" (" .. received .. " fragments)")
+    elseif data_length > 0 then
+        subtree:add(f_data, buffer(header_length, data_length))
     end
 end
 
@@ -0,0 +1,72 @@
+#fixed capacity buffer for fragments received out of order
+#fragment is stored in slot (fragment number % window size), so memory depends only on window
+class ReorderBuffer:
+    def __init__(self, window_size):
+        self.size = max(1, window_size)
+        self.slots = [None] * self.size
+        #next fragment to save
+        self.next = 0
+        self.count = 0
+        #highest stored fragment
+        self.highest = -1
+
+    #fragment fits into window starting with next fragment to save
+    def in_window(self, frag_num):
+        return self.next <= frag_num < self.next + self.size
+
+    #storing fragment, False if it is outside of window or already stored
+    def add(self, frag_num, data):
+        if not self.in_window(frag_num):
+            return False
+        slot = frag_num % self.size
+        if self.slots[slot] is not None:
+            return False
+        self.slots[slot] = data
+        self.count += 1
+        self.highest = max(self.highest, frag_num)
+        return True
+
+    def __contains__(self, frag_num):
+        return self.in_window(frag_num) and self.slots[frag_num % self.size] is not None
+
+    #in order fragments are returned and their slots freed
+    def pop_ready(self):
+        while True:
+            slot = self.next % self.size
+            data = self.slots[slot]
+            if data is None:
+                return
+            self.slots[slot] = None
+            self.count -= 1
+            self.next += 1
+            yield data
+
+    #bitmap of stored fragments after next fragment to save (selective acknowledgement)
+    #bit 0x80 of first byte is fragment next + 1
+    def sack_bitmap(self, max_bytes=None):
+        if self.count == 0:
+            return b''
+        if max_bytes is None:
+            max_bytes = SACK_MAX_BYTES
+        last = min(self.highest, self.next + max_bytes * 8)
+        bitmap = bytearray((last - self.next + 7) // 8)
+        for frag_num in range(self.next + 1, last + 1):
+            if self.slots[frag_num % self.size] is not None:
+                k = frag_num - self.next - 1
+                bitmap[k >> 3] |= 0x80 >> (k & 7)
+        return bytes(bitmap)
+
+
+#SACK bitmap has to fit into one message
+SACK_MAX_BYTES = 1024
+
+
+#fragments acknowledged by bitmap, first bit is fragment after first missing fragment
+def decode_sack(first_missing, bitmap):
+    fragments = []
+    for index, byte in enumerate(bitmap):
+        if byte:
+            for bit in range(8):
+                if byte & (0x80 >> bit):
+                    fragments.append(first_missing + 1 + index * 8 + bit)
+    return fragments
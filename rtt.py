@@ -0,0 +1,70 @@
+import time
+
+#retransmission timeout limits in seconds, initial timeout is used before first sample
+INITIAL_RTO = 0.5
+MIN_RTO = 0.1
+MAX_RTO = 30.0
+MAX_BACKOFF = 64
+#gains of smoothed RTT and RTT variation (RFC 6298)
+ALPHA = 1 / 8
+BETA = 1 / 4
+#clock granularity
+GRANULARITY = 0.001
+
+
+#round trip time estimation of one connection (RFC 6298),
+#every timeout of protocol is derived from it
+class RttEstimator:
+    def __init__(self):
+        self.reset()
+
+    #new connection starts without samples
+    def reset(self):
+        self.srtt = None
+        self.rttvar = None
+        self.rto = INITIAL_RTO
+        self.backoff = 1
+        #name of message waiting for acknowledgement -> time of sending
+        self.probes = {}
+
+    def sample(self, rtt):
+        if self.srtt is None:
+            self.srtt = rtt
+            self.rttvar = rtt / 2
+        else:
+            self.rttvar = (1 - BETA) * self.rttvar + BETA * abs(self.srtt - rtt)
+            self.srtt = (1 - ALPHA) * self.srtt + ALPHA * rtt
+        self.rto = min(max(self.srtt + max(GRANULARITY, 4 * self.rttvar), MIN_RTO), MAX_RTO)
+        #new sample ends exponential backoff
+        self.backoff = 1
+
+    #retransmission timeout with exponential backoff
+    def timeout(self):
+        return min(self.rto * self.backoff, MAX_RTO)
+
+    #smoothed RTT, or initial timeout if there is no sample yet
+    def smoothed(self):
+        if self.srtt is None:
+            return INITIAL_RTO
+        return self.srtt
+
+    #timeout expired, next timeout is doubled
+    def on_timeout(self):
+        self.backoff = min(self.backoff * 2, MAX_BACKOFF)
+
+    #message waiting for acknowledgement was sent,
+    #retransmitted message can't be sampled, its acknowledgement is ambiguous (Karn's algorithm)
+    def start(self, name, retransmitted=False):
+        if retransmitted:
+            self.probes[name] = None
+        else:
+            self.probes[name] = time.monotonic()
+
+    #acknowledgement of message was received, returns sampled RTT or None
+    def finish(self, name):
+        sent = self.probes.pop(name, None)
+        if sent is None:
+            return None
+        rtt = time.monotonic() - sent
+        self.sample(rtt)
+        return rtt
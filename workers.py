@@ -0,0 +1,124 @@
+import asyncio
+import collections
+import multiprocessing
+import queue
+import socket
+import sys
+import time
+from engine import Engine, validate_settings
+from logger import Logger
+
+#seconds between statistics sent by workers to coordinator
+STATS_INTERVAL = 1.0
+
+
+#several sockets can listen on one port only on Linux
+def reuse_port_supported():
+    if not sys.platform.startswith('linux') or not hasattr(socket, 'SO_REUSEPORT'):
+        return False
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    try:
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+        return True
+    except OSError:
+        return False
+    finally:
+        sock.close()
+
+
+#worker is one process with its own engine listening on the shared port,
+#output, status, received files and statistics are sent to coordinator in events queue
+async def run_worker(index, local_address, settings, max_peers, events, logger):
+    engine = Engine(local_address,
+                    output=lambda text: events.put(('output', index, text)),
+                    status=lambda connected, sending: events.put(('status', index, connected, sending)),
+                    received=lambda kind, value, peer: events.put(('received', index, kind, value, peer)),
+                    logger=logger,
+                    max_peers=max_peers, reuse_port=True)
+    await engine.start()
+    try:
+        engine.configure(settings)
+        while True:
+            events.put(('stats', index, engine.stats()))
+            await asyncio.sleep(STATS_INTERVAL)
+    finally:
+        await engine.close()
+
+
+#logger with its writer thread is created in worker process
+def worker_main(index, local_address, settings, max_peers, events, logger_factory):
+    try:
+        asyncio.run(run_worker(index, local_address, settings, max_peers, events, logger_factory()))
+    except KeyboardInterrupt:
+        pass
+
+
+#coordinator starts workers, which share listening port with SO_REUSEPORT, kernel spreads peers among them,
+#so received datagrams are processed on several cores, every worker saves files into download directory
+#of settings given by coordinator, coordinator collects their output and statistics
+class Coordinator:
+    def __init__(self, local_address, settings, workers, max_peers=1, output=print, logger_factory=Logger):
+        validate_settings(settings)
+        self.local_address = local_address
+        self.settings = settings
+        self.workers = workers
+        self.max_peers = max_peers
+        self.output = output
+        self.logger_factory = logger_factory
+        self.events = None
+        self.processes = []
+        #last statistics and state of connections of every worker
+        self.worker_stats = {}
+        self.connected = {}
+        self.received = []
+
+    def start(self):
+        if not reuse_port_supported():
+            raise OSError("SO_REUSEPORT is not supported by system")
+        self.events = multiprocessing.Queue()
+        for index in range(self.workers):
+            process = multiprocessing.Process(target=worker_main, daemon=True,
+                                              args=(index, self.local_address, self.settings, self.max_peers,
+                                                    self.events, self.logger_factory))
+            process.start()
+            self.processes.append(process)
+
+    def stop(self):
+        for process in self.processes:
+            process.terminate()
+        for process in self.processes:
+            process.join()
+        self.processes = []
+
+    #events of workers are processed until timeout
+    def poll(self, timeout):
+        deadline = time.monotonic() + timeout
+        while True:
+            try:
+                event = self.events.get(timeout=max(0.0, deadline - time.monotonic()))
+            except queue.Empty:
+                return
+            kind, index = event[0], event[1]
+            if kind == 'output':
+                self.output(event[2])
+            elif kind == 'status':
+                self.connected[index] = event[2]
+            elif kind == 'received':
+                self.received.append(event[2:])
+            elif kind == 'stats':
+                self.worker_stats[index] = event[2]
+                self.connected[index] = event[2]['connected'] > 0
+
+    #some worker has connected peer
+    def any_connected(self):
+        return any(self.connected.values())
+
+    #counters summed over workers with statistics of every worker
+    def stats(self):
+        totals = collections.Counter()
+        for stats in self.worker_stats.values():
+            totals.update({name: value for name, value in stats.items()
+                           if isinstance(value, int) and not isinstance(value, bool)})
+        stats = dict(totals)
+        stats['workers'] = [self.worker_stats.get(index) for index in range(self.workers)]
+        return stats